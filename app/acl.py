@@ -0,0 +1,102 @@
+import os
+from typing import Iterable, Optional, Tuple
+
+import faiss
+import numpy as np
+
+# Per-chunk ACL bitsets (TENANCY_MODE=acl), position-aligned with index.faiss:
+# row i = uint64 words of principal bits for FAISS position i.
+ACL_FILE = "acl.npy"
+
+# "*" shares with the whole department; user bits are assigned per namespace from 1 up
+PUBLIC = "*"
+PUBLIC_BIT = 0
+
+def load_acl(index_dir: str) -> Optional[np.ndarray]:
+    path = os.path.join(index_dir, ACL_FILE)
+    return np.load(path) if os.path.exists(path) else None
+
+def save_acl(index_dir: str, acl: np.ndarray) -> None:
+    tmp = os.path.join(index_dir, ACL_FILE + ".tmp.npy")
+    np.save(tmp, acl)
+    os.replace(tmp, os.path.join(index_dir, ACL_FILE))
+
+def _widen(acl: np.ndarray, bits: Iterable[int]) -> np.ndarray:
+    words = max([b // 64 + 1 for b in bits] + [acl.shape[1]])
+    if words == acl.shape[1]:
+        return acl
+    return np.hstack([acl, np.zeros((acl.shape[0], words - acl.shape[1]), dtype=np.uint64)])
+
+def mask_words(bits: Iterable[int], words: int) -> np.ndarray:
+    m = np.zeros(words, dtype=np.uint64)
+    for b in bits:
+        if b // 64 < words:
+            m[b // 64] |= np.uint64(1) << np.uint64(b % 64)
+    return m
+
+def append_rows(acl: Optional[np.ndarray], n: int, bits: Iterable[int]) -> np.ndarray:
+    bits = list(bits)
+    if acl is None:
+        acl = np.zeros((0, 1), dtype=np.uint64)
+    acl = _widen(acl, bits)
+    rows = np.tile(mask_words(bits, acl.shape[1]), (n, 1))
+    return np.vstack([acl, rows])
+
+def pad_public(acl: Optional[np.ndarray], ntotal: int) -> np.ndarray:
+    # positions indexed without an ACL (dept mode, before acl mode) are department-wide
+    if acl is None:
+        acl = np.zeros((0, 1), dtype=np.uint64)
+    if len(acl) >= ntotal:
+        return acl
+    return append_rows(acl, ntotal - len(acl), [PUBLIC_BIT])
+
+def check_aligned(acl: Optional[np.ndarray], ntotal: int) -> np.ndarray:
+    """
+    ACL rows for exactly `ntotal` positions. No acl.npy (namespace indexed before acl mode)
+    means department-wide; an acl.npy that doesn't cover the index is an error (fail closed).
+    """
+    if acl is None:
+        return pad_public(acl, ntotal)
+    if len(acl) != ntotal:
+        raise RuntimeError(f"acl.npy has {len(acl)} rows for {ntotal} indexed chunks: re-ingest the namespace")
+    return acl
+
+def grant(acl: np.ndarray, positions: Iterable[int], bits: Iterable[int]) -> np.ndarray:
+    bits = list(bits)
+    acl = _widen(acl, bits)
+    acl[np.fromiter(positions, dtype=np.int64)] |= mask_words(bits, acl.shape[1])
+    return acl
+
+def allowed(acl: np.ndarray, bits: Iterable[int]) -> np.ndarray:
+    """Boolean mask over positions: any of `bits` set."""
+    return (acl & mask_words(bits, acl.shape[1])).any(axis=1)
+
+def filtered_search(index: faiss.Index, query: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    index.search restricted to positions where `mask` is True, enforced inside FAISS
+    with a bitmap ID selector (IndexPQ has no selector support: over-fetch + post-filter).
+    """
+    if mask is None:
+        return index.search(query, k)
+
+    if not mask.any():
+        return np.full((len(query), k), np.inf, dtype="float32"), np.full((len(query), k), -1, dtype="int64")
+
+    if isinstance(faiss.downcast_index(index), faiss.IndexPQ):
+        fetch = k * 4
+        while True:
+            D, I = index.search(query, min(fetch, index.ntotal))
+            keep = (I >= 0) & mask[np.clip(I, 0, None)]
+            if keep.sum(axis=1).min() >= k or fetch >= index.ntotal:
+                break
+            fetch *= 2
+        out_d = np.full((len(query), k), np.inf, dtype="float32")
+        out_i = np.full((len(query), k), -1, dtype="int64")
+        for row in range(len(query)):
+            d, i = D[row][keep[row]][:k], I[row][keep[row]][:k]
+            out_d[row, :len(d)], out_i[row, :len(i)] = d, i
+        return out_d, out_i
+
+    bitmap = np.packbits(mask, bitorder="little")
+    params = faiss.SearchParameters(sel=faiss.IDSelectorBitmap(bitmap))
+    return index.search(query, k, params=params)
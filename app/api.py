@@ -1,19 +1,66 @@
+import json
 import time
-from fastapi import FastAPI, HTTPException
+import threading
+from contextlib import asynccontextmanager, AsyncExitStack
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 
 from .tenancy import Tenancy
-from .config import CHUNK_SIZE, CHUNK_OVERLAP, TOP_K, TOP_N
+from .config import (
+    CHUNK_SIZE, CHUNK_OVERLAP, TOP_K, TOP_N, SEMANTIC_CACHE_ENABLED, BATCH_MAX_QUESTIONS, BATCH_CONCURRENCY,
+    LIMIT_SCOPE, COALESCE_REQUESTS, RERANK_DEADLINE_MS,
+)
 from .ingestion import build_records_from_pdf
-from .embedding import ingest_into_namespace
-from .retrieval import search
+from .embedding import ingest_into_namespace, share_document
+from .retrieval import search, embed_query
+from .cache import get_cache, cache_variant, flush_caches
+from .manifest_store import get_store
 from .reranker import rerank
 from .generation import generate_answer
+from .batch import answer_batch, pack_sources
+from .warmup import warm_up, record_traffic, flush_traffic
+from .load_control import ConcurrencyLimiter, SingleFlight, DeadlineRunner, Overloaded
+
+# Readiness is separate from liveness: /health answers immediately,
+# /ready only once warm-up (imports, clients, hottest indexes) has finished.
+_ready = threading.Event()
+_warmup_report: dict = {}
+
+def _run_warmup():
+    try:
+        _warmup_report.update(warm_up())
+    except Exception as e:
+        _warmup_report["error"] = str(e)
+    finally:
+        _ready.set()
+
+# Load control: admission runs on the event loop, so one tenant's bulk traffic holds at most
+# TENANT_MAX_CONCURRENCY worker threads (queued requests hold none); identical concurrent
+# /chat requests share one pipeline run.
+_limiter = ConcurrencyLimiter()
+_flights = SingleFlight()
+_deadlines = DeadlineRunner()
+
+def _limit_key(tenancy: Tenancy) -> str:
+    return tenancy.tenant_id if LIMIT_SCOPE == "tenant" else tenancy.namespace
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    threading.Thread(target=_run_warmup, name="warmup", daemon=True).start()
+    yield
+    flush_traffic()
+    flush_caches()
 
 app = FastAPI(
     title="FortressRAG — Multi-Dept Classic RAG (FAISS)",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 class IngestRequest(BaseModel):
@@ -24,6 +71,15 @@ class IngestRequest(BaseModel):
     version: str
     file_path: str
     collection: str = "knowledgebase"
+    share_with: List[str] = []  # TENANCY_MODE=acl: user_ids, "*" = whole dept
+
+class ShareRequest(BaseModel):
+    tenant_id: str
+    dept_id: str
+    user_id: str
+    doc_id: str
+    share_with: List[str]
+    collection: str = "knowledgebase"
 
 class IngestResponse(BaseModel):
     status: str
@@ -32,6 +88,10 @@ class IngestResponse(BaseModel):
     doc_id: Optional[str] = None
     version: Optional[str] = None
     chunks: int = 0
+    # incremental re-ingest: chunks embedded / reused from the previous version / retired
+    embedded: Optional[int] = None
+    reused: Optional[int] = None
+    retired: Optional[int] = None
 
 class ChatRequest(BaseModel):
     tenant_id: str
@@ -42,7 +102,21 @@ class ChatRequest(BaseModel):
     use_reranker: bool = True
     top_k: int = TOP_K
     top_n: int = TOP_N
+    use_cache: bool = True
     debug: bool = False
+    rerank_deadline_ms: Optional[int] = None  # default RERANK_DEADLINE_MS; 0 = wait for rerank
+
+class BatchChatRequest(BaseModel):
+    tenant_id: str
+    dept_id: str
+    user_id: str
+    questions: List[str]
+    collection: str = "knowledgebase"
+    use_reranker: bool = True
+    top_k: int = TOP_K
+    top_n: int = TOP_N
+    use_cache: bool = True
+    concurrency: int = BATCH_CONCURRENCY  # parallel rerank/generation calls (capped at BATCH_CONCURRENCY)
 
 class SourceChunk(BaseModel):
     id: str
@@ -56,6 +130,9 @@ class ChatResponse(BaseModel):
     answer: str
     sources: List[SourceChunk]
     latency_ms: dict
+    cached: bool = False
+    coalesced: bool = False  # answered by an identical request already in flight
+    rerank_skipped: bool = False  # rerank missed its deadline: top-N of retrieval used
     retrieved: Optional[List[SourceChunk]] = None
     reranked: Optional[List[SourceChunk]] = None
 
@@ -63,6 +140,50 @@ class ChatResponse(BaseModel):
 def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready():
+    if not _ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {"status": "ready", "warmup": _warmup_report}
+
+@app.get("/load")
+async def load():
+    # requests running / queued per tenant (or namespace, LIMIT_SCOPE) in this worker
+    return {"scope": LIMIT_SCOPE, "limits": _limiter.stats()}
+
+@app.get("/namespaces")
+def list_namespaces(
+    tenant_id: Optional[str] = None,
+    dept_id: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    return {"namespaces": get_store().list_namespaces(tenant_id, dept_id, limit=limit, offset=offset)}
+
+@app.get("/namespaces/{namespace}/docs")
+def list_namespace_docs(
+    namespace: str,
+    status: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    return {
+        "namespace": namespace,
+        "docs": get_store().list_versions(namespace=namespace, status=status, limit=limit, offset=offset),
+    }
+
+@app.get("/tenants/{tenant_id}/docs")
+def list_tenant_docs(
+    tenant_id: str,
+    status: Optional[str] = "ACTIVE",
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    return {
+        "tenant_id": tenant_id,
+        "docs": get_store().list_versions(tenant_id=tenant_id, status=status, limit=limit, offset=offset),
+    }
+
 @app.post("/ingest", response_model=IngestResponse)
 def ingest(req: IngestRequest):
     try:
@@ -76,7 +197,7 @@ def ingest(req: IngestRequest):
             version=req.version,
         )
 
-        out = ingest_into_namespace(tenancy, meta)
+        out = ingest_into_namespace(tenancy, meta, share_with=req.share_with)
         return IngestResponse(
             status=out["status"],
             message=out["message"],
@@ -84,76 +205,191 @@ def ingest(req: IngestRequest):
             doc_id=out.get("doc_id"),
             version=out.get("version"),
             chunks=out.get("chunks", 0),
+            embedded=out.get("embedded"),
+            reused=out.get("reused"),
+            retired=out.get("retired"),
         )
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/share", response_model=IngestResponse)
+def share(req: ShareRequest):
+    try:
+        tenancy = Tenancy(req.tenant_id, req.dept_id, req.user_id, req.collection)
+        out = share_document(tenancy, req.doc_id, req.share_with)
+        return IngestResponse(
+            status=out["status"],
+            message=out["message"],
+            namespace=out.get("namespace"),
+            doc_id=out.get("doc_id"),
+            version=out.get("version"),
+            chunks=out.get("chunks", 0),
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Document not found")
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 def _pack(items: List[dict]) -> List[SourceChunk]:
-    out = []
-    for i, c in enumerate(items, 1):
-        out.append(SourceChunk(
-            id=c.get("id",""),
-            score=float(c.get("score", 0.0)),
-            source=c.get("source",""),
-            pages=c.get("pages",""),
-            chunk_text=(c.get("chunk_text","")[:200] + "...") if c.get("chunk_text") else "",
-            citation=f"[{i}]",
-        ))
-    return out
+    return [SourceChunk(**s) for s in pack_sources(items)]
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest):
     t0 = time.perf_counter()
     try:
         tenancy = Tenancy(req.tenant_id, req.dept_id, req.user_id, req.collection)
+        record_traffic(tenancy.namespace)
+        limit_key = _limit_key(tenancy)
+
+        async def run() -> ChatResponse:
+            async with _limiter.slot(limit_key):
+                return await run_in_threadpool(_answer, req, tenancy, t0)
+
+        if not COALESCE_REQUESTS:
+            return await run()
+        # cache_dir = who sees the same chunks (namespace; per user in acl mode)
+        key = (
+            tenancy.cache_dir, " ".join(req.question.split()).lower(),
+            req.use_reranker, req.top_k, req.top_n, req.use_cache, req.debug, req.rerank_deadline_ms,
+        )
+        # followers take a queue place while they wait for the shared run
+        resp, shared = await _flights.do(key, run, follower=lambda: _limiter.queued(limit_key))
+        return resp.model_copy(update={"coalesced": True}) if shared else resp
 
-        t_retr0 = time.perf_counter()
-        retrieved = search(tenancy, req.question, top_k=req.top_k)
-        t_retr1 = time.perf_counter()
+    except Overloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if not retrieved:
+def _answer(req: ChatRequest, tenancy: Tenancy, t0: float) -> ChatResponse:
+    # Semantic cache: one query embedding, reused by retrieval on a miss
+    query_vector = None
+    manifest_gen = None
+    variant = cache_variant(req.top_k, req.top_n, req.use_reranker)
+    t_c0 = time.perf_counter()
+    if req.use_cache and SEMANTIC_CACHE_ENABLED:
+        query_vector = embed_query(tenancy, req.question)
+        manifest_gen = get_store().generation(tenancy.namespace)
+        hit = get_cache(tenancy, variant).lookup(query_vector, manifest_gen)
+        if hit:
             return ChatResponse(
-                answer="Not found in the provided documents.",
-                sources=[],
+                answer=hit["answer"],
+                sources=[SourceChunk(**s) for s in hit["sources"]],
                 latency_ms={
-                    "retrieval": round((t_retr1 - t_retr0) * 1000, 2),
+                    "cache": round((time.perf_counter() - t_c0) * 1000, 2),
+                    "retrieval": 0.0,
                     "rerank": 0.0,
                     "generation": 0.0,
                     "total": round((time.perf_counter() - t0) * 1000, 2),
                 },
+                cached=True,
             )
+    t_c1 = time.perf_counter()
 
-        t_rr0 = time.perf_counter()
-        if req.use_reranker:
-            reranked = rerank(req.question, retrieved, top_n=req.top_n)
-            chunks = reranked
-        else:
-            reranked = []
-            chunks = retrieved[:req.top_n]
-        t_rr1 = time.perf_counter()
-
-        t_gen0 = time.perf_counter()
-        answer = generate_answer(req.question, chunks)
-        t_gen1 = time.perf_counter()
-
-        resp = ChatResponse(
-            answer=answer,
-            sources=_pack(chunks),
+    t_retr0 = time.perf_counter()
+    retrieved = search(tenancy, req.question, top_k=req.top_k, query_vector=query_vector)
+    t_retr1 = time.perf_counter()
+
+    if not retrieved:
+        return ChatResponse(
+            answer="Not found in the provided documents.",
+            sources=[],
             latency_ms={
+                "cache": round((t_c1 - t_c0) * 1000, 2),
                 "retrieval": round((t_retr1 - t_retr0) * 1000, 2),
-                "rerank": round((t_rr1 - t_rr0) * 1000, 2),
-                "generation": round((t_gen1 - t_gen0) * 1000, 2),
+                "rerank": 0.0,
+                "generation": 0.0,
                 "total": round((time.perf_counter() - t0) * 1000, 2),
             },
         )
 
-        if req.debug:
-            resp.retrieved = _pack(retrieved)
-            resp.reranked = _pack(reranked) if req.use_reranker else None
+    t_rr0 = time.perf_counter()
+    rerank_skipped = False
+    deadline_ms = RERANK_DEADLINE_MS if req.rerank_deadline_ms is None else req.rerank_deadline_ms
+    if req.use_reranker and deadline_ms > 0:
+        # give up on rerank rather than the latency SLO (time already spent counts)
+        remaining = deadline_ms / 1000 - (t_rr0 - t0)
+        reranked, done = _deadlines.call(_limit_key(tenancy), rerank, remaining, req.question, retrieved, top_n=req.top_n)
+        rerank_skipped = not done
+        reranked = reranked or []
+        chunks = reranked if done else retrieved[:req.top_n]
+    elif req.use_reranker:
+        reranked = rerank(req.question, retrieved, top_n=req.top_n)
+        chunks = reranked
+    else:
+        reranked = []
+        chunks = retrieved[:req.top_n]
+    t_rr1 = time.perf_counter()
+
+    t_gen0 = time.perf_counter()
+    answer = generate_answer(req.question, chunks)
+    t_gen1 = time.perf_counter()
+
+    resp = ChatResponse(
+        answer=answer,
+        sources=_pack(chunks),
+        latency_ms={
+            "cache": round((t_c1 - t_c0) * 1000, 2),
+            "retrieval": round((t_retr1 - t_retr0) * 1000, 2),
+            "rerank": round((t_rr1 - t_rr0) * 1000, 2),
+            "generation": round((t_gen1 - t_gen0) * 1000, 2),
+            "total": round((time.perf_counter() - t0) * 1000, 2),
+        },
+        rerank_skipped=rerank_skipped,
+    )
+
+    # degraded (un-reranked) answers are not cached
+    if manifest_gen is not None and not rerank_skipped:
+        get_cache(tenancy, variant).put(
+            query_vector, manifest_gen, req.question, answer,
+            [s.model_dump() for s in resp.sources],
+        )
+
+    if req.debug:
+        resp.retrieved = _pack(retrieved)
+        resp.reranked = _pack(reranked) if req.use_reranker else None
 
-        return resp
+    return resp
 
+@app.post("/chat/batch")
+async def chat_batch(req: BatchChatRequest):
+    """
+    Many questions against one namespace; streams one JSON line per question
+    (in completion order, `index` = position in `questions`) with its latencies.
+    """
+    if not req.questions:
+        raise HTTPException(status_code=400, detail="questions is empty")
+    if len(req.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+
+    # one tenant slot for the whole batch, held until the stream ends
+    slot = AsyncExitStack()
+    try:
+        tenancy = Tenancy(req.tenant_id, req.dept_id, req.user_id, req.collection)
+        record_traffic(tenancy.namespace, len(req.questions))
+        await slot.enter_async_context(_limiter.slot(_limit_key(tenancy)))
+        results = await run_in_threadpool(
+            answer_batch, tenancy, req.questions,
+            use_reranker=req.use_reranker, top_k=req.top_k, top_n=req.top_n,
+            use_cache=req.use_cache, concurrency=min(max(1, req.concurrency), BATCH_CONCURRENCY),
+        )
+    except Overloaded as e:
+        raise _overloaded(e)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        await slot.aclose()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def _stream():
+        async with slot:
+            async for r in iterate_in_threadpool(results):
+                yield json.dumps(r) + "\n"
+
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
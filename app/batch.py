@@ -0,0 +1,120 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, List, Tuple
+
+from .config import TOP_K, TOP_N, SEMANTIC_CACHE_ENABLED, BATCH_CONCURRENCY
+from .tenancy import Tenancy
+from .retrieval import embed_queries, search_batch
+from .cache import get_cache, cache_variant
+from .manifest_store import get_store
+from .reranker import rerank
+from .generation import generate_answer
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+def pack_sources(items: List[Dict]) -> List[Dict[str, Any]]:
+    """Numbered source entries as returned to clients (and stored in the semantic cache)."""
+    out = []
+    for i, c in enumerate(items, 1):
+        out.append({
+            "id": c.get("id", ""),
+            "score": float(c.get("score", 0.0)),
+            "source": c.get("source", ""),
+            "pages": c.get("pages", ""),
+            "chunk_text": (c.get("chunk_text", "")[:200] + "...") if c.get("chunk_text") else "",
+            "citation": f"[{i}]",
+        })
+    return out
+
+def _answer_one(question: str, retrieved: List[Dict], use_reranker: bool, top_n: int) -> Tuple[str, List[Dict], float, float]:
+    t_rr0 = time.perf_counter()
+    chunks = rerank(question, retrieved, top_n=top_n) if use_reranker else retrieved[:top_n]
+    t_gen0 = time.perf_counter()
+    answer = generate_answer(question, chunks)
+    return answer, chunks, t_gen0 - t_rr0, time.perf_counter() - t_gen0
+
+def answer_batch(
+    tenancy: Tenancy,
+    questions: List[str],
+    use_reranker: bool = True,
+    top_k: int = TOP_K,
+    top_n: int = TOP_N,
+    use_cache: bool = True,
+    concurrency: int = BATCH_CONCURRENCY,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Answer many questions against one namespace:
+
+    - one batched embeddings call and one matrix FAISS search for all questions
+      (semantic cache hits skip retrieval);
+    - rerank + generation run on at most `concurrency` threads;
+    - results are yielded as they complete (`index` = position in `questions`).
+
+    Embedding/search errors are raised here, before the first result;
+    a failing question yields a result with `error` instead.
+    """
+    t0 = time.perf_counter()
+    vectors = embed_queries(tenancy, questions) if questions else []
+    t_emb = time.perf_counter()
+
+    hits: Dict[int, Dict[str, Any]] = {}
+    manifest_gen = None
+    variant = cache_variant(top_k, top_n, use_reranker)
+    if use_cache and SEMANTIC_CACHE_ENABLED:
+        manifest_gen = get_store().generation(tenancy.namespace)
+        cache = get_cache(tenancy, variant)
+        for i, vector in enumerate(vectors):
+            hit = cache.lookup(vector, manifest_gen)
+            if hit:
+                hits[i] = hit
+    t_cache = time.perf_counter()
+
+    misses = [i for i in range(len(questions)) if i not in hits]
+    retrieved = search_batch(tenancy, [questions[i] for i in misses], top_k, [vectors[i] for i in misses]) if misses else []
+    t_search = time.perf_counter()
+
+    # batch-wide stages, shared by every question
+    shared = {"embed": _ms(t_emb - t0), "cache": _ms(t_cache - t_emb), "retrieval": _ms(t_search - t_cache)}
+
+    def _stream() -> Iterator[Dict[str, Any]]:
+        for i, hit in hits.items():
+            yield {
+                "index": i,
+                "question": questions[i],
+                "answer": hit["answer"],
+                "sources": hit["sources"],
+                "cached": True,
+                "latency_ms": {**shared, "rerank": 0.0, "generation": 0.0, "total": _ms(time.perf_counter() - t0)},
+            }
+
+        pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch")
+        try:
+            futures = {
+                pool.submit(_answer_one, questions[i], chunks, use_reranker, top_n): (i, chunks)
+                for i, chunks in zip(misses, retrieved)
+            }
+            for fut in as_completed(futures):
+                i, chunks = futures[fut]
+                try:
+                    answer, used, t_rr, t_gen = fut.result()
+                except Exception as e:
+                    yield {"index": i, "question": questions[i], "error": str(e)}
+                    continue
+
+                sources = pack_sources(used)
+                if manifest_gen is not None and chunks:
+                    get_cache(tenancy, variant).put(vectors[i], manifest_gen, questions[i], answer, sources)
+                yield {
+                    "index": i,
+                    "question": questions[i],
+                    "answer": answer,
+                    "sources": sources,
+                    "cached": False,
+                    "latency_ms": {**shared, "rerank": _ms(t_rr), "generation": _ms(t_gen), "total": _ms(time.perf_counter() - t0)},
+                }
+        finally:
+            # client went away: don't start the remaining LLM calls
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return _stream()
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+import faiss
+import numpy as np
+
+from .config import SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_FLUSH_S, SEMANTIC_CACHE_MAX_NAMESPACES
+from .tenancy import Tenancy
+
+def _normalize(vector: List[float]) -> np.ndarray:
+    v = np.array(vector, dtype="float32").reshape(1, -1)
+    faiss.normalize_L2(v)
+    return v
+
+class SemanticCache:
+    """
+    Per-namespace answer cache keyed by question embeddings.
+
+    - Lookup: nearest past question by cosine similarity (normalized vectors + inner product).
+    - Invalidation: the whole cache is dropped when the namespace's manifest generation changes
+      (bumped on every change of ACTIVE versions).
+    - Eviction: oldest entries first once SEMANTIC_CACHE_MAX_ENTRIES is exceeded.
+    - Persistence: off the request path, at most every SEMANTIC_CACHE_FLUSH_S seconds;
+      entries and vectors are written together to one file, replaced atomically
+      (with several workers, the last flush wins).
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._index: Optional[faiss.IndexFlatIP] = None
+        self._entries: List[Dict[str, Any]] = []
+        self._dirty = False
+        self._flush_timer: Optional[threading.Timer] = None
+        self._load()
+
+    @property
+    def _path(self) -> str:
+        # entries and vectors in one file: a pair can never come from two different writers
+        return os.path.join(self.cache_dir, "cache.npz")
+
+    def _load(self) -> None:
+        if not os.path.exists(self._path):
+            return
+        with np.load(self._path) as data:
+            state = json.loads(str(data["state"]))
+            vectors = data["vectors"]
+        entries = state.get("entries", [])
+        if len(entries) != len(vectors) or not len(vectors):
+            return
+        self._generation = state.get("generation")
+        self._entries = entries
+        self._vectors = vectors
+        self._rebuild()
+
+    def _schedule_flush(self) -> None:
+        # called with the lock held
+        self._dirty = True
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(SEMANTIC_CACHE_FLUSH_S, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            generation, entries, vectors = self._generation, list(self._entries), self._vectors
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if vectors is None:
+            vectors = np.zeros((0, 1), dtype="float32")
+        # unique temp name: workers flushing the same cache_dir never share a temp file
+        tmp = f"{self._path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, vectors=vectors, state=np.array(json.dumps({"generation": generation, "entries": entries})))
+        os.replace(tmp, self._path)
+
+    def _rebuild(self) -> None:
+        self._index = faiss.IndexFlatIP(self._vectors.shape[1])
+        self._index.add(self._vectors)
+
+    def _reset(self, generation: int) -> None:
+        self._generation = generation
+        self._vectors = None
+        self._index = None
+        self._entries = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, vector: List[float], generation: int, threshold: float = SEMANTIC_CACHE_THRESHOLD) -> Optional[Dict[str, Any]]:
+        q = _normalize(vector)
+        with self._lock:
+            if self._generation != generation:
+                self._reset(generation)
+                self._schedule_flush()
+                return None
+            if self._index is None or self._index.d != q.shape[1]:
+                return None
+
+            scores, ids = self._index.search(q, 1)
+            score, idx = float(scores[0][0]), int(ids[0][0])
+            if idx < 0 or idx >= len(self._entries) or score < threshold:
+                return None
+            return {**self._entries[idx], "similarity": score}
+
+    def put(self, vector: List[float], generation: int, question: str, answer: str, sources: List[Dict[str, Any]]) -> None:
+        q = _normalize(vector)
+        with self._lock:
+            # Embedding width can change with namespace settings; never mix dimensions
+            if self._generation != generation or (self._vectors is not None and self._vectors.shape[1] != q.shape[1]):
+                self._reset(generation)
+
+            self._vectors = q if self._vectors is None else np.vstack([self._vectors, q])
+            self._entries.append({
+                "question": question,
+                "answer": answer,
+                "sources": sources,
+                "created_at": int(time.time()),
+            })
+
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                self._vectors = self._vectors[overflow:]
+                self._entries = self._entries[overflow:]
+                self._rebuild()
+            elif self._index is None:
+                self._rebuild()
+            else:
+                self._index.add(q)
+
+            self._schedule_flush()
+
+# keyed by cache_dir + variant; least recently used caches are flushed and dropped beyond SEMANTIC_CACHE_MAX_NAMESPACES
+_caches: "OrderedDict[str, SemanticCache]" = OrderedDict()
+_caches_lock = threading.Lock()
+
+def cache_variant(top_k: int, top_n: int, use_reranker: bool) -> str:
+    # answers (and their sources) depend on these request parameters: one cache per combination
+    return f"k{top_k}-n{top_n}-{'rerank' if use_reranker else 'norerank'}"
+
+def get_cache(tenancy: Tenancy, variant: str) -> SemanticCache:
+    cache_dir = os.path.join(tenancy.cache_dir, variant)
+    evicted = []
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            cache = SemanticCache(cache_dir)
+            _caches[cache_dir] = cache
+        _caches.move_to_end(cache_dir)
+        while len(_caches) > max(1, SEMANTIC_CACHE_MAX_NAMESPACES):
+            evicted.append(_caches.popitem(last=False)[1])
+    for old in evicted:
+        old.flush()
+    return cache
+
+def flush_caches() -> None:
+    # persist pending entries (called on shutdown)
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.flush()
@@ -20,9 +20,80 @@ TOP_N = int(os.getenv("TOP_N", "4"))
 # Storage
 STORAGE_ROOT = os.getenv("STORAGE_ROOT", "storage").strip()
 
+# Governance manifest (SQLite, WAL mode). Legacy JSON manifests: python main.py import-manifests
+MANIFEST_DB = os.getenv("MANIFEST_DB", os.path.join(STORAGE_ROOT, "manifest.db")).strip()
+
 # Tenancy mode:
 # dept = shared index per dept (cost-effective)
 # user = per-user index (maximum isolation)
+# acl  = shared index per dept, per-user ACL bitsets enforced inside the vector search
 TENANCY_MODE = os.getenv("TENANCY_MODE", "dept").strip().lower()
-if TENANCY_MODE not in ("dept", "user"):
-    TENANCY_MODE = "dept"
\ No newline at end of file
+if TENANCY_MODE not in ("dept", "user", "acl"):
+    TENANCY_MODE = "dept"
+
+# Semantic answer cache (per namespace):
+# past questions are matched by cosine similarity of their embeddings
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_FLUSH_S = float(os.getenv("SEMANTIC_CACHE_FLUSH_S", "5"))  # persistence delay (off the request path)
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_MAX_NAMESPACES = int(os.getenv("SEMANTIC_CACHE_MAX_NAMESPACES", "256"))  # caches kept in memory per worker
+
+# Serving (python main.py serve --prod)
+SERVE_HOST = os.getenv("SERVE_HOST", "0.0.0.0").strip()
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8000"))
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", "4"))
+
+# Warm-up: preload the N hottest namespaces before /ready reports ready
+# updated_at = most recently ingested manifests, traffic = most queried (storage/traffic.json)
+WARMUP_NAMESPACES = int(os.getenv("WARMUP_NAMESPACES", "5"))
+WARMUP_STRATEGY = os.getenv("WARMUP_STRATEGY", "updated_at").strip().lower()
+if WARMUP_STRATEGY not in ("updated_at", "traffic"):
+    WARMUP_STRATEGY = "updated_at"
+# Loaded namespace indexes kept per worker (least recently used evicted); keep >= WARMUP_NAMESPACES
+INDEX_CACHE_MAX = int(os.getenv("INDEX_CACHE_MAX", "32"))
+
+# Vector quantization (namespace default; per-namespace override: python main.py quantize ...)
+# none = float32 (exact), fp16 = float16, int8 = 8-bit scalar quantizer, pq = product quantization
+INDEX_QUANTIZATION = os.getenv("INDEX_QUANTIZATION", "none").strip().lower()
+if INDEX_QUANTIZATION not in ("none", "fp16", "int8", "pq"):
+    INDEX_QUANTIZATION = "none"
+PQ_M = int(os.getenv("PQ_M", "64"))  # PQ sub-quantizers (= bytes per vector at 8 bits)
+# int8/pq namespaces stay Flat until they hold this many vectors, then are trained on all of them
+# (PQ: ~39 training points per centroid x 256 centroids); retrained when they grow QUANT_RETRAIN_GROWTH x
+QUANT_MIN_TRAIN_INT8 = int(os.getenv("QUANT_MIN_TRAIN_INT8", "1000"))
+QUANT_MIN_TRAIN_PQ = int(os.getenv("QUANT_MIN_TRAIN_PQ", "10000"))
+QUANT_RETRAIN_GROWTH = float(os.getenv("QUANT_RETRAIN_GROWTH", "2"))
+# Exact re-scoring: fetch top_k * RESCORE_FACTOR quantized hits, re-rank with float32 vectors (memory-mapped)
+RESCORE = os.getenv("RESCORE", "true").strip().lower() in ("1", "true", "yes")
+RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", "4"))
+
+# Matryoshka embeddings (text-embedding-3-*): namespace default, 0 = full model width
+EMBED_DIM = int(os.getenv("EMBED_DIM", "0"))
+# Two-stage search: coarse search over the first COARSE_DIM dims picks top_k * COARSE_FACTOR
+# candidates, full vectors re-score them (0 = disabled)
+COARSE_DIM = int(os.getenv("COARSE_DIM", "0"))
+COARSE_FACTOR = int(os.getenv("COARSE_FACTOR", "8"))
+
+# Incremental re-ingest: a new version only embeds chunks whose text changed vs the ACTIVE version;
+# unchanged chunks are re-pointed to the new version, removed ones are retired from search
+INCREMENTAL_INGEST = os.getenv("INCREMENTAL_INGEST", "true").strip().lower() in ("1", "true", "yes")
+
+# Batch Q&A (/chat/batch, main.py ask-batch): questions per request, concurrent rerank/generation calls
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# Retrieval evaluation (python main.py eval): chunk/query embeddings cached here so reruns work offline
+EVAL_CACHE_DIR = os.getenv("EVAL_CACHE_DIR", os.path.join(STORAGE_ROOT, "eval_cache"))
+
+# Load control (API): per-tenant (or per-namespace) concurrency; requests beyond the queue get 429
+LIMIT_SCOPE = os.getenv("LIMIT_SCOPE", "tenant").strip().lower()
+if LIMIT_SCOPE not in ("tenant", "namespace"):
+    LIMIT_SCOPE = "tenant"
+TENANT_MAX_CONCURRENCY = int(os.getenv("TENANT_MAX_CONCURRENCY", "8"))  # 0 = unlimited
+TENANT_MAX_QUEUE = int(os.getenv("TENANT_MAX_QUEUE", "16"))
+QUEUE_TIMEOUT_MS = int(os.getenv("QUEUE_TIMEOUT_MS", "5000"))
+# Identical concurrent /chat requests (namespace, user, question, params) share one pipeline run
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").strip().lower() in ("1", "true", "yes")
+# Rerank is skipped (top-N of retrieval used) once a request is this old (0 = no deadline)
+RERANK_DEADLINE_MS = int(os.getenv("RERANK_DEADLINE_MS", "0"))
@@ -1,48 +1,304 @@
 import os
-import json
-import time
-from typing import Dict, Any, List
-from langchain_openai import OpenAIEmbeddings
-from langchain_core.documents import Document
-from langchain_community.vectorstores import FAISS
-
-from .config import OPENAI_API_KEY, EMBED_MODEL
+import threading
+import numpy as np
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+try:  # POSIX: serialize writers across API workers too
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from .config import OPENAI_API_KEY, EMBED_MODEL, INCREMENTAL_INGEST, QUANT_RETRAIN_GROWTH
 from .tenancy import Tenancy
+from .manifest_store import get_store, namespace_settings
+from .quantization import (
+    QUANTIZATIONS, ORIGINALS_FILE, build_index, factory_string, is_pending, min_train, load_originals, save_originals,
+)
+from .matryoshka import COARSE_FILE, prefix, load_coarse, save_coarse
+from .acl import PUBLIC, PUBLIC_BIT, load_acl, save_acl, append_rows, check_aligned, grant, allowed
+from .lifecycle import retire
+from .ingestion import sha256_text
+
+# LangChain/OpenAI imports are heavy (~2s); they are deferred to first use (or warm-up)
+if TYPE_CHECKING:
+    from langchain_openai import OpenAIEmbeddings
+    from langchain_community.vectorstores import FAISS
 
 def _ensure_dir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
-def load_manifest(path: str) -> Dict[str, Any]:
-    _ensure_dir(os.path.dirname(path))
-    if not os.path.exists(path):
-        return {"docs": {}, "updated_at": None}
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_manifest(path: str, m: Dict[str, Any]) -> None:
-    _ensure_dir(os.path.dirname(path))
-    m["updated_at"] = int(time.time())
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(m, f, indent=2)
-
-def _load_or_create_index(index_dir: str, embeddings: OpenAIEmbeddings) -> FAISS:
-    if os.path.exists(index_dir):
-        return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
-
-    # Create a tiny starter index (so add_documents works even on first run)
-    starter = FAISS.from_texts(["init"], embeddings, metadatas=[{"source": "init", "id": "init"}])
-    _ensure_dir(index_dir)
-    starter.save_local(index_dir)
-    return starter
+def _remove(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+# index.faiss and its position-aligned side files (vectors, coarse, acl, retired) are rewritten as a
+# unit: one writer per namespace at a time (thread lock in-process, file lock across workers)
+_ns_locks: Dict[str, threading.RLock] = {}
+_ns_locks_guard = threading.Lock()
+_ns_held = threading.local()
+
+@contextmanager
+def namespace_lock(index_dir: str) -> Iterator[None]:
+    """Exclusive load -> modify -> save of a namespace's index files; re-entrant within a thread."""
+    with _ns_locks_guard:
+        lock = _ns_locks.setdefault(index_dir, threading.RLock())
+    with lock:
+        held = _ns_held.__dict__.setdefault("dirs", set())
+        if index_dir in held or fcntl is None:
+            yield
+            return
+        ns_dir = os.path.dirname(index_dir)
+        _ensure_dir(ns_dir)
+        with open(os.path.join(ns_dir, "write.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            held.add(index_dir)
+            try:
+                yield
+            finally:
+                held.discard(index_dir)
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def _with_namespace_lock(fn: Callable[..., Any]) -> Callable[..., Any]:
+    @wraps(fn)
+    def wrapper(tenancy: Tenancy, *args: Any, **kwargs: Any) -> Any:
+        with namespace_lock(tenancy.index_dir_current):
+            return fn(tenancy, *args, **kwargs)
+    return wrapper
+
+def get_embeddings(dimensions: Optional[int] = None) -> "OpenAIEmbeddings":
+    # None / 0 both mean the model's full width: one cache key, so warm-up creates the client queries use
+    return _embeddings_client(dimensions or None)
+
+@lru_cache(maxsize=None)
+def _embeddings_client(dimensions: Optional[int]) -> "OpenAIEmbeddings":
+    # One client per process and width (connection pool reused across requests)
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=EMBED_MODEL, api_key=OPENAI_API_KEY, dimensions=dimensions)
+
+def embed_width(settings: Dict[str, Any], index_d: Optional[int] = None) -> int:
+    """
+    `dimensions` to request for a namespace: its embed_dim, unless its index is wider
+    (EMBED_DIM lowered after it was built, not rebuilt yet): then the full width,
+    truncated to the index (Matryoshka prefix) by the caller. 0 = model's full width.
+    """
+    dim = settings["embed_dim"]
+    if index_d is not None and dim and dim < index_d:
+        return 0
+    return dim
+
+def _load_index(index_dir: str, embeddings: "OpenAIEmbeddings") -> Optional["FAISS"]:
+    from langchain_community.vectorstores import FAISS
+
+    if not os.path.exists(index_dir):
+        return None
+    return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+
+def _update_settings(tenancy: Tenancy, **updates: Any) -> None:
+    # only what was set explicitly is stored; everything else keeps following the env defaults
+    get_store().set_settings(tenancy.namespace, {**get_store().get_settings(tenancy.namespace), **updates})
+
+def _create_index(tenancy: Tenancy, embeddings: "OpenAIEmbeddings", vectors: np.ndarray, settings: Dict[str, Any]) -> "FAISS":
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    # Empty index of the namespace's quantization; int8/pq start Flat until there is enough data to train
+    index = build_index(vectors, settings["quantization"], settings["pq_m"])
+    if min_train(settings["quantization"]) and not is_pending(index, settings["quantization"]):
+        # trained on the first batch: ingest retrains once the namespace outgrows it
+        settings["trained_on"] = len(vectors)
+        _update_settings(tenancy, trained_on=len(vectors))
+    return FAISS(embeddings, index, InMemoryDocstore(), {})
+
+@_with_namespace_lock
+def rebuild_namespace(tenancy: Tenancy, **overrides: Any) -> Dict[str, Any]:
+    """
+    Store new index settings for a namespace (only the `overrides` given; the rest keeps
+    following the env defaults) and rebuild its index from the existing vectors:
+    - quantization: re-encode (codebooks re-trained on all vectors; int8/pq stay Flat below min_train)
+    - embed_dim: Matryoshka truncation of the stored vectors (shrink only, no re-embedding)
+    - coarse_dim: (re)build the low-dim coarse index for two-stage search
+    """
+    from langchain_community.vectorstores import FAISS
+
+    settings = {**namespace_settings(tenancy), **overrides}
+    if settings["quantization"] not in QUANTIZATIONS:
+        raise ValueError(f"quantization must be one of {QUANTIZATIONS}")
+
+    index_dir = tenancy.index_dir_current
+    if not os.path.exists(index_dir):
+        _update_settings(tenancy, **overrides)
+        return {"namespace": tenancy.namespace, "settings": settings, "vectors": 0}
+
+    db = FAISS.load_local(index_dir, get_embeddings(), allow_dangerous_deserialization=True)
+    originals = load_originals(index_dir)
+    if originals is None:
+        # legacy float32 index: reconstruct is exact for Flat
+        originals = db.index.reconstruct_n(0, db.index.ntotal)
+    originals = np.ascontiguousarray(originals, dtype="float32")
+
+    dim = settings["embed_dim"] or originals.shape[1]
+    if dim > originals.shape[1]:
+        raise ValueError(f"embed_dim {dim} > stored width {originals.shape[1]}: re-ingest to grow dimensions")
+    if dim < originals.shape[1]:
+        originals = prefix(originals, dim)
+    if settings["coarse_dim"] and settings["coarse_dim"] >= dim:
+        raise ValueError(f"coarse_dim must be < embed_dim ({dim})")
+    # vectors the quantizer was trained on (0 = still Flat); ingest retrains once the namespace outgrows it
+    settings["trained_on"] = len(originals) if len(originals) >= min_train(settings["quantization"]) else 0
+    _update_settings(tenancy, **overrides, trained_on=settings["trained_on"])
+
+    index = build_index(originals, settings["quantization"], settings["pq_m"])
+    index.add(originals)
+    db.index = index
+
+    if settings["quantization"] == "none":
+        _remove(os.path.join(index_dir, ORIGINALS_FILE))
+    else:
+        save_originals(index_dir, originals, append=False)
+    if settings["coarse_dim"]:
+        save_coarse(index_dir, originals, settings["coarse_dim"], append=False)
+    else:
+        _remove(os.path.join(index_dir, COARSE_FILE))
+    db.save_local(index_dir)
+
+    return {
+        "namespace": tenancy.namespace,
+        "settings": settings,
+        "vectors": int(index.ntotal),
+        "dim": dim,
+        "index": factory_string(settings["quantization"], dim, len(originals), settings["pq_m"]),
+        "pending_training": is_pending(index, settings["quantization"]),
+    }
+
+def _needs_training(index, settings: Dict[str, Any]) -> bool:
+    if min_train(settings["quantization"]) == 0:
+        return False
+    if is_pending(index, settings["quantization"]):
+        return index.ntotal >= min_train(settings["quantization"])
+    trained_on = settings.get("trained_on") or 0
+    return bool(trained_on) and index.ntotal >= trained_on * QUANT_RETRAIN_GROWTH
+
+def _doc_positions(db: "FAISS", doc_id: str, version: Optional[str] = None) -> List[int]:
+    positions = []
+    for pos, _id in db.index_to_docstore_id.items():
+        md = db.docstore.search(_id).metadata or {}
+        if md.get("doc_id") == doc_id and (version is None or md.get("version") == version):
+            positions.append(pos)
+    return positions
+
+def _acl_bits(tenancy: Tenancy, user_ids: List[str]) -> List[int]:
+    users = [u for u in user_ids if u != PUBLIC]
+    bits = list(get_store().principal_bits(tenancy.namespace, users).values())
+    return bits + ([PUBLIC_BIT] if PUBLIC in user_ids else [])
+
+def _diff_chunks(db: "FAISS", doc_id: str, prev_version: str, records: List[Dict[str, Any]]) -> Tuple[Dict[int, int], List[int]]:
+    """
+    Match new chunks against the previous version's by text hash.
+    Returns ({record index: reused position}, positions of removed chunks).
+    """
+    old: Dict[str, List[int]] = {}
+    for pos in _doc_positions(db, doc_id, prev_version):
+        doc = db.docstore.search(db.index_to_docstore_id[pos])
+        h = doc.metadata.get("chunk_hash") or sha256_text(doc.page_content)  # chunks indexed before hashing
+        old.setdefault(h, []).append(pos)
+
+    reused: Dict[int, int] = {}
+    for i, r in enumerate(records):
+        positions = old.get(r.get("chunk_hash") or sha256_text(r["chunk_text"]))
+        if positions:
+            reused[i] = positions.pop(0)
+    return reused, sorted(p for positions in old.values() for p in positions)
+
+def _chunk_metadata(tenancy: Tenancy, r: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": r["id"],
+        "doc_id": r["doc_id"],
+        "version": r["version"],
+        "doc_hash": r["doc_hash"],
+        "source": r["source"],
+        "pages": r.get("pages", ""),
+        "chunk_id": r.get("chunk_id", 0),
+        "chunk_hash": r.get("chunk_hash") or sha256_text(r["chunk_text"]),
+        "status": "ACTIVE",
+        "owner": tenancy.user_id,
+    }
+
+def _can_see(tenancy: Tenancy, acl: np.ndarray, positions: List[int]) -> bool:
+    caller = get_store().principal_bits(tenancy.namespace, [tenancy.user_id], create=False)
+    return bool(allowed(acl[positions], [PUBLIC_BIT, *caller.values()]).all())
+
+@_with_namespace_lock
+def share_document(
+    tenancy: Tenancy,
+    doc_id: str,
+    share_with: List[str],
+    require_access: bool = True,
+) -> Dict[str, Any]:
+    """
+    TENANCY_MODE=acl: grant users ("*" = whole department) access to the ACTIVE chunks of a doc.
+    The caller must already see the doc unless `require_access` is False.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    if tenancy.scope != "acl":
+        raise ValueError("Sharing requires TENANCY_MODE=acl")
+
+    doc = get_store().get_doc(tenancy.namespace, doc_id)
+    index_dir = tenancy.index_dir_current
+    if not doc or not os.path.exists(index_dir):
+        raise FileNotFoundError(doc_id)
+
+    db = FAISS.load_local(index_dir, get_embeddings(), allow_dangerous_deserialization=True)
+    positions = _doc_positions(db, doc_id, doc["active_version"])
+    acl = check_aligned(load_acl(index_dir), db.index.ntotal)
+
+    if require_access and (not positions or not _can_see(tenancy, acl, positions)):
+        raise PermissionError(f"'{tenancy.user_id}' has no access to '{doc_id}'")
+
+    acl = grant(acl, positions, _acl_bits(tenancy, share_with))
+    save_acl(index_dir, acl)
+    get_store().bump_generation(tenancy.namespace)
+
+    return {
+        "status": "SHARED",
+        "message": f"'{doc_id}' shared with {', '.join(share_with)}.",
+        "namespace": tenancy.namespace,
+        "doc_id": doc_id,
+        "version": doc["active_version"],
+        "chunks": len(positions),
+    }
+
+def _skipped_duplicate(tenancy: Tenancy, doc_id: str, version: str) -> Dict[str, Any]:
+    return {
+        "status": "SKIPPED_DUPLICATE",
+        "message": f"'{doc_id}' already ingested (same hash).",
+        "namespace": tenancy.namespace,
+        "doc_id": doc_id,
+        "version": version,
+        "chunks": 0,
+    }
 
-def ingest_into_namespace(tenancy: Tenancy, doc_meta: Dict[str, Any]) -> Dict[str, Any]:
+@_with_namespace_lock
+def ingest_into_namespace(
+    tenancy: Tenancy,
+    doc_meta: Dict[str, Any],
+    share_with: Optional[List[str]] = None,
+) -> Dict[str, Any]:
     """
     Enterprise-friendly ingestion strategy:
 
     - Duplicate detection: if ACTIVE hash matches -> skip.
     - Version strategy: manifest keeps versions; old ACTIVE becomes DEPRECATED.
     - Lifecycle: ACTIVE/DEPRECATED tracked in manifest.
-    - Index strategy (FAISS): append new ACTIVE chunks; for strict cleanup, scheduled rebuild can be used.
+    - Index strategy (FAISS): append new ACTIVE chunks. With INCREMENTAL_INGEST a new version is
+      diffed against the ACTIVE one by chunk text hash: only changed chunks are embedded and
+      appended, unchanged ones are re-pointed to the new version, removed ones are retired.
+    - ACL (TENANCY_MODE=acl): chunks are visible to the owner, `share_with` users ("*" = dept)
+      and whoever could see the previous version; a file already ACTIVE in the dept index
+      is not re-embedded, the uploader is granted access instead. Only users who can see
+      every chunk of the ACTIVE version may replace it (PermissionError otherwise).
     """
     if not OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY missing in .env")
@@ -56,71 +312,111 @@ def ingest_into_namespace(tenancy: Tenancy, doc_meta: Dict[str, Any]) -> Dict[st
     doc_hash = doc_meta["doc_hash"]
     source = doc_meta["file_name"]
 
-    embeddings = OpenAIEmbeddings(model=EMBED_MODEL, api_key=OPENAI_API_KEY)
-
-    # Manifest (governance)
-    manifest = load_manifest(tenancy.manifest_path)
-    docs = manifest.setdefault("docs", {})
-    entry = docs.setdefault(doc_id, {"versions": {}, "active_version": None, "active_doc_hash": None, "source": source})
-
-    # Duplicate detection
-    if entry.get("active_doc_hash") == doc_hash:
-        return {
-            "status": "SKIPPED_DUPLICATE",
-            "message": f"'{doc_id}' already ingested (same hash).",
-            "namespace": tenancy.namespace,
-            "doc_id": doc_id,
-            "version": entry.get("active_version"),
-            "chunks": 0,
-        }
-
-    # Deprecate previous version (if any)
-    prev_active = entry.get("active_version")
-    if prev_active:
-        prev = entry["versions"].setdefault(str(prev_active), {})
-        prev["status"] = "DEPRECATED"
-        prev["deprecated_at"] = int(time.time())
-
-    # Activate new version
-    entry["versions"][str(version)] = {
-        "doc_hash": doc_hash,
-        "source": source,
-        "chunks": len(records),
-        "status": "ACTIVE",
-        "ingested_at": int(time.time()),
-    }
-    entry["active_version"] = str(version)
-    entry["active_doc_hash"] = doc_hash
-    entry["source"] = source
-    docs[doc_id] = entry
+    share_with = list(share_with or [])
+    acl_mode = tenancy.scope == "acl"
+    if acl_mode:
+        existing = get_store().find_active_by_hash(tenancy.namespace, doc_hash)
+        if existing:
+            out = share_document(tenancy, existing["doc_id"], [tenancy.user_id, *share_with], require_access=False)
+            out["status"] = "SHARED_DUPLICATE"
+            out["message"] = f"'{existing['doc_id']}' already indexed (same hash); access granted."
+            return out
+    prev = get_store().get_doc(tenancy.namespace, doc_id)
 
-    save_manifest(tenancy.manifest_path, manifest)
+    # Duplicate detection (re-checked on activation)
+    if prev and prev["active_doc_hash"] == doc_hash:
+        return _skipped_duplicate(tenancy, doc_id, prev["active_version"])
 
-    # FAISS index append
+    # Vectors embedded once (quantizer training + float32 originals), at the width of the
+    # existing index. Everything that can fail runs before the version is activated.
+    settings = namespace_settings(tenancy)
     index_dir = tenancy.index_dir_current
-    db = _load_or_create_index(index_dir, embeddings)
-
-    new_docs: List[Document] = []
-    for r in records:
-        new_docs.append(
-            Document(
-                page_content=r["chunk_text"],
-                metadata={
-                    "id": r["id"],
-                    "doc_id": r["doc_id"],
-                    "version": r["version"],
-                    "doc_hash": r["doc_hash"],
-                    "source": r["source"],
-                    "pages": r.get("pages", ""),
-                    "chunk_id": r.get("chunk_id", 0),
-                    "status": "ACTIVE",
-                },
-            )
+    db = _load_index(index_dir, get_embeddings(settings["embed_dim"]))
+    embeddings = get_embeddings(embed_width(settings, db.index.d if db is not None else None))
+
+    # acl: a new version replaces (and retires) the current one, so the caller must see all of it
+    prev_version = (prev or {}).get("active_version")
+    if acl_mode and db is not None and prev_version:
+        prev_positions = _doc_positions(db, doc_id, prev_version)
+        if prev_positions and not _can_see(tenancy, check_aligned(load_acl(index_dir), db.index.ntotal), prev_positions):
+            raise PermissionError(f"'{tenancy.user_id}' has no access to '{doc_id}'")
+
+    # Incremental re-ingest: chunks whose text is unchanged keep their vectors (no re-embedding)
+    reused: Dict[int, int] = {}
+    removed: List[int] = []
+    if INCREMENTAL_INGEST and db is not None and prev_version and prev_version != str(version):
+        reused, removed = _diff_chunks(db, doc_id, prev_version, records)
+    changed = [r for i, r in enumerate(records) if i not in reused]
+
+    vectors = np.zeros((0, db.index.d if db is not None else 0), dtype="float32")
+    if changed:
+        vectors = np.array(embeddings.embed_documents([r["chunk_text"] for r in changed]), dtype="float32")
+
+    # An existing index keeps its width until rebuilt; wider embeddings are truncated (Matryoshka)
+    if changed and db is not None and db.index.d < vectors.shape[1]:
+        vectors = prefix(vectors, db.index.d)
+    elif changed and db is not None and db.index.d > vectors.shape[1]:
+        raise ValueError(
+            f"Index width {db.index.d} > embedding width {vectors.shape[1]}: "
+            "rebuild the namespace with the new embed_dim first"
         )
 
-    db.add_documents(new_docs)
+    # Manifest (governance): duplicate check + ACTIVE/DEPRECATED switch in one transaction
+    activation = get_store().activate_version(
+        tenancy, doc_id, str(version), doc_hash, source, len(records)
+    )
+    if activation["status"] == "SKIPPED_DUPLICATE":
+        return _skipped_duplicate(tenancy, doc_id, activation["version"])
+
+    # FAISS index append
+    if db is None:
+        db = _create_index(tenancy, embeddings, vectors, settings)
+
+    n_before = db.index.ntotal
+    if changed:
+        db.add_embeddings(
+            list(zip([r["chunk_text"] for r in changed], vectors.tolist())),
+            metadatas=[_chunk_metadata(tenancy, r) for r in changed],
+        )
+    # unchanged chunks: same vector and position, re-pointed to the new version
+    for i, pos in reused.items():
+        db.docstore.search(db.index_to_docstore_id[pos]).metadata.update(_chunk_metadata(tenancy, records[i]))
+    for pos in removed:
+        db.docstore.search(db.index_to_docstore_id[pos]).metadata["status"] = "RETIRED"
     _ensure_dir(index_dir)
+
+    # float32 originals must stay position-aligned with the index (else re-scoring is skipped)
+    originals = load_originals(index_dir)
+    if changed and settings["quantization"] != "none" and (0 if originals is None else len(originals)) == n_before:
+        save_originals(index_dir, vectors)
+    # same for the coarse (two-stage) index; a misaligned one is ignored at search time
+    coarse = load_coarse(index_dir)
+    coarse_dim = settings["coarse_dim"]
+    if changed and coarse_dim and coarse_dim < db.index.d and (0 if coarse is None else coarse.ntotal) == n_before:
+        save_coarse(index_dir, vectors, coarse_dim)
+    if acl_mode:
+        acl = check_aligned(load_acl(index_dir), n_before)
+        bits = _acl_bits(tenancy, [tenancy.user_id, *share_with])
+        if prev_version:
+            # readers of the previous version keep access to the new one
+            prev_positions = [p for p in _doc_positions(db, doc_id, prev_version) if p < n_before]
+            inherited = acl[prev_positions + list(reused.values())]
+            words = np.bitwise_or.reduce(inherited, axis=0) if len(inherited) else []
+            bits += [w * 64 + b for w, word in enumerate(words) for b in range(64) if int(word) >> b & 1]
+        acl = append_rows(acl, len(changed), set(bits))
+        if reused:
+            acl = grant(acl, reused.values(), set(bits))
+        save_acl(index_dir, acl)
+    if removed:
+        retire(index_dir, db.index.ntotal, removed)
     db.save_local(index_dir)
+    # activation already bumped the generation, but /chat requests in between searched the old
+    # index and may have cached answers under the new generation: invalidate them once more
+    get_store().bump_generation(tenancy.namespace)
+
+    # int8/pq: train once there is enough data, retrain as the namespace grows (codebooks fit all vectors)
+    if _needs_training(db.index, settings):
+        rebuild_namespace(tenancy)
 
     return {
         "status": "INGESTED",
@@ -128,6 +424,9 @@ def ingest_into_namespace(tenancy: Tenancy, doc_meta: Dict[str, Any]) -> Dict[st
         "namespace": tenancy.namespace,
         "doc_id": doc_id,
         "version": version,
-        "chunks": len(new_docs),
+        "chunks": len(records),
+        "embedded": len(changed),
+        "reused": len(reused),
+        "retired": len(removed),
         "index_dir": index_dir,
-    }
\ No newline at end of file
+    }
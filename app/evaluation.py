@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from .config import (
+    CHUNK_SIZE, CHUNK_OVERLAP, TOP_K, EMBED_MODEL, PQ_M, RESCORE, RESCORE_FACTOR, COARSE_FACTOR, EVAL_CACHE_DIR,
+)
+from .ingestion import extract_pdf_pages, chunk_with_page_tracking
+from .quantization import PQ_CENTROIDS, build_index, can_train, factory_string, search as quantized_search
+from .matryoshka import prefix, two_stage_search
+
+# Retrieval-quality harness: labelled questions -> expected (source, pages), scored per retrieval config.
+# A retrieved chunk is relevant when it comes from the expected source and covers an expected page.
+
+class EmbeddingCache:
+    """
+    Full-width embeddings keyed by sha256(text), one cache per model (keys.json + vectors.npy).
+    Offline: texts missing from the cache are an error instead of an API call.
+    """
+
+    def __init__(self, cache_dir: str = EVAL_CACHE_DIR, model: str = EMBED_MODEL, offline: bool = False):
+        self.cache_dir = os.path.join(cache_dir, model)
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._vectors: Optional[np.ndarray] = None
+        keys_path = os.path.join(self.cache_dir, "keys.json")
+        if os.path.exists(keys_path):
+            with open(keys_path, "r", encoding="utf-8") as f:
+                self._rows = {k: i for i, k in enumerate(json.load(f))}
+            self._vectors = np.load(os.path.join(self.cache_dir, "vectors.npy"))
+
+    def _save(self) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, "keys.json"), "w", encoding="utf-8") as f:
+            json.dump(sorted(self._rows, key=self._rows.get), f)
+        np.save(os.path.join(self.cache_dir, "vectors.npy"), self._vectors)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0 if self._vectors is None else self._vectors.shape[1]), dtype="float32")
+        keys = [hashlib.sha256(t.encode("utf-8")).hexdigest() for t in texts]
+        with self._lock:
+            missing = {k: t for k, t in zip(keys, texts) if k not in self._rows}
+            if missing:
+                if self.offline:
+                    raise RuntimeError(f"{len(missing)} texts not in the embedding cache ({self.cache_dir}); run once online")
+                from .embedding import get_embeddings
+
+                new = np.array(get_embeddings().embed_documents(list(missing.values())), dtype="float32")
+                start = 0 if self._vectors is None else len(self._vectors)
+                self._vectors = new if self._vectors is None else np.vstack([self._vectors, new])
+                self._rows.update({k: start + i for i, k in enumerate(missing)})
+                self._save()
+            return self._vectors[[self._rows[k] for k in keys]]
+
+def load_labelled(path: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    JSONL of {"question", "doc" (PDF path), "pages": [...]} -> (questions, corpus).
+    PDFs are extracted once; questions reference them by file name.
+    """
+    questions, corpus, seen = [], [], set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            source = os.path.basename(item["doc"])
+            if source not in seen:
+                seen.add(source)
+                corpus.append({"source": source, "pages": extract_pdf_pages(item["doc"])})
+            questions.append({"question": item["question"], "source": source, "pages": [int(p) for p in item["pages"]]})
+    return questions, corpus
+
+_SUBJECTS = ["warehouse", "payroll", "vendor", "audit", "pipeline", "contract", "laboratory", "campus", "fleet", "ledger"]
+_ATTRIBUTES = ["budget", "owner", "deadline", "location", "approval code", "headcount", "supplier", "risk rating"]
+_FILLER = (
+    "The committee reviewed the quarterly figures and noted no material changes. "
+    "Further details are provided in the appendix of this report. "
+    "All amounts are unaudited and subject to revision. "
+)
+
+def synthetic_corpus(n_docs: int = 20, pages: int = 10, seed: int = 0) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Deterministic documents with one unique fact per page (and one question per fact),
+    for scale / latency runs beyond the bundled PDFs.
+    """
+    rng = random.Random(seed)
+    questions, corpus = [], []
+    for d in range(n_docs):
+        source = f"synthetic-{d:03d}.pdf"
+        doc_pages = []
+        for p in range(1, pages + 1):
+            entity = f"{rng.choice(_SUBJECTS)} project {d:03d}-{p:02d}"
+            attribute = rng.choice(_ATTRIBUTES)
+            value = f"{rng.randint(100, 9999)} {rng.choice(['units', 'days', 'thousand dollars', 'points'])}"
+            fact = f"The {attribute} of the {entity} is {value}. "
+            doc_pages.append({"page": p, "text": _FILLER * rng.randint(2, 5) + fact + _FILLER * rng.randint(2, 5)})
+            questions.append({"question": f"What is the {attribute} of the {entity}?", "source": source, "pages": [p]})
+        corpus.append({"source": source, "pages": doc_pages})
+    return questions, corpus
+
+def default_configs() -> List[Dict[str, Any]]:
+    base = {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP, "top_k": TOP_K, "quantization": "none"}
+    return [
+        base,
+        {**base, "chunk_size": 500, "chunk_overlap": 100},
+        {**base, "chunk_size": 1500, "chunk_overlap": 250},
+        {**base, "top_k": 4},
+        {**base, "quantization": "int8"},
+        {**base, "quantization": "pq"},
+        {**base, "embed_dim": 512},
+        {**base, "coarse_dim": 256},
+    ]
+
+def _chunk_corpus(corpus: List[Dict[str, Any]], chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    chunks = []
+    for doc in corpus:
+        for c in chunk_with_page_tracking(doc["pages"], chunk_size, chunk_overlap):
+            chunks.append({"source": doc["source"], "pages": {int(p) for p in c["pages"].split(",") if p}, "text": c["chunk_text"]})
+    return chunks
+
+def _relevant(chunk: Dict[str, Any], question: Dict[str, Any]) -> bool:
+    return chunk["source"] == question["source"] and bool(chunk["pages"] & set(question["pages"]))
+
+def run_config(
+    cfg: Dict[str, Any],
+    chunks: List[Dict[str, Any]],
+    vectors: np.ndarray,
+    questions: List[Dict[str, Any]],
+    query_vectors: np.ndarray,
+) -> Dict[str, Any]:
+    """Build the config's index over pre-embedded chunks and score every question against it."""
+    k = cfg.get("top_k", TOP_K)
+    full = vectors.shape[1]
+    dim = min(cfg.get("embed_dim") or full, full)
+    base, queries = (vectors, query_vectors) if dim == full else (prefix(vectors, dim), prefix(query_vectors, dim))
+    base, queries = np.ascontiguousarray(base, dtype="float32"), np.ascontiguousarray(queries, dtype="float32")
+
+    # the quantizer itself is measured, even below the min_train a namespace would wait for
+    quantization = cfg.get("quantization", "none")
+    if not can_train(quantization, len(base)):
+        return {**cfg, "chunks": len(chunks), "skipped": f"not enough vectors to train ({len(base)} < {PQ_CENTROIDS})"}
+    index = build_index(base, quantization, cfg.get("pq_m", PQ_M), force=True)
+    index.add(base)
+    rescore = quantization != "none" and cfg.get("rescore", RESCORE)
+    originals = base if rescore else None
+    factor = cfg.get("rescore_factor", RESCORE_FACTOR) if rescore else 1
+
+    coarse_dim = cfg.get("coarse_dim") or 0
+    coarse = None
+    if coarse_dim and coarse_dim < dim:
+        coarse = faiss.IndexFlatL2(coarse_dim)
+        coarse.add(prefix(base, coarse_dim))
+
+    latencies, hits, reciprocal = [], 0, 0.0
+    for qi, question in enumerate(questions):
+        t0 = time.perf_counter()
+        if coarse is not None:
+            _, positions = two_stage_search(coarse, index, queries[qi:qi + 1], k, cfg.get("coarse_factor", COARSE_FACTOR), originals)
+        else:
+            _, positions = quantized_search(index, queries[qi:qi + 1], k, originals, factor)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+        ranks = [r for r, pos in enumerate(positions, 1) if pos >= 0 and _relevant(chunks[int(pos)], question)]
+        if ranks:
+            hits += 1
+            reciprocal += 1.0 / ranks[0]
+
+    n = max(1, len(questions))
+    return {
+        **cfg,
+        "index": factory_string(quantization, dim, len(base), cfg.get("pq_m", PQ_M), force=True),
+        "chunks": len(chunks),
+        "recall@k": round(hits / n, 4),
+        "mrr": round(reciprocal / n, 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3) if latencies else 0.0,
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3) if latencies else 0.0,
+        "index_mb": round(len(faiss.serialize_index(index)) / 1e6, 3),
+    }
+
+def evaluate(
+    questions: List[Dict[str, Any]],
+    corpus: List[Dict[str, Any]],
+    configs: Optional[List[Dict[str, Any]]] = None,
+    workers: int = 4,
+    cache: Optional[EmbeddingCache] = None,
+) -> List[Dict[str, Any]]:
+    """
+    recall@k (share of questions with a relevant chunk in the top k), MRR and p50/p95 search
+    latency per config, side by side. Chunks and questions are embedded once through the cache
+    (shared across configs); index build + search run on `workers` threads.
+    Latencies are comparable within a run; use workers=1 for uncontended numbers.
+    """
+    configs = configs or default_configs()
+    cache = cache or EmbeddingCache()
+
+    query_vectors = cache.embed([q["question"] for q in questions])
+    chunk_sets: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+    for cfg in configs:
+        key = (cfg.get("chunk_size", CHUNK_SIZE), cfg.get("chunk_overlap", CHUNK_OVERLAP))
+        if key not in chunk_sets:
+            chunk_sets[key] = _chunk_corpus(corpus, *key)
+    # one embeddings pass over every chunking (texts shared between chunkings are embedded once)
+    cache.embed(sorted({c["text"] for chunks in chunk_sets.values() for c in chunks}))
+
+    def _run(cfg: Dict[str, Any]) -> Dict[str, Any]:
+        chunks = chunk_sets[(cfg.get("chunk_size", CHUNK_SIZE), cfg.get("chunk_overlap", CHUNK_OVERLAP))]
+        return run_config(cfg, chunks, cache.embed([c["text"] for c in chunks]), questions, query_vectors)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(_run, configs))
@@ -1,7 +1,17 @@
+from functools import lru_cache
 from typing import List, Dict
-from langchain_openai import ChatOpenAI
 from .config import OPENAI_API_KEY, LLM_MODEL
 
+@lru_cache(maxsize=None)
+def get_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=LLM_MODEL,
+        api_key=OPENAI_API_KEY,
+        temperature=0.2,
+        max_tokens=900,
+    )
+
 def generate_answer(question: str, chunks: List[Dict]) -> str:
     if not chunks:
         return "Not found in the provided documents."
@@ -9,12 +19,7 @@ def generate_answer(question: str, chunks: List[Dict]) -> str:
     if not OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY missing in .env")
 
-    llm = ChatOpenAI(
-        model=LLM_MODEL,
-        api_key=OPENAI_API_KEY,
-        temperature=0.2,
-        max_tokens=900,
-    )
+    llm = get_llm()
 
     context_parts = []
     for i, c in enumerate(chunks, 1):
@@ -37,4 +42,4 @@ def generate_answer(question: str, chunks: List[Dict]) -> str:
         ("human", f"Context:\n{context}\n\n---\nQuestion: {question}")
     ])
 
-    return msg.content
\ No newline at end of file
+    return msg.content
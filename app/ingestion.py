@@ -11,6 +11,9 @@ def sha256_file(path: str) -> str:
             h.update(chunk)
     return h.hexdigest()
 
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
 def extract_pdf_pages(pdf_path: str) -> List[Dict[str, Any]]:
     reader = PdfReader(pdf_path)
     pages = []
@@ -26,31 +29,25 @@ def chunk_with_page_tracking(
     chunk_size: int,
     chunk_overlap: int
 ) -> List[Dict[str, str]]:
-    # Flatten pages into full_text and track which char belongs to which page
-    full_text = ""
-    char_to_page = []
-
-    for p in pages:
-        if full_text:
-            full_text += " "
-            char_to_page.append(p["page"])
-        full_text += p["text"]
-        char_to_page.extend([p["page"]] * len(p["text"]))
-
+    # The stride restarts on every page: an edit only changes the chunks of its own page,
+    # so unchanged pages produce the same chunk texts (and hashes) across versions
     chunks = []
-    start = 0
     step = max(1, chunk_size - chunk_overlap)
 
-    while start < len(full_text):
-        end = min(start + chunk_size, len(full_text))
-        chunk_text = full_text[start:end].strip()
-        if chunk_text:
-            page_set = sorted(set(char_to_page[start:end]))
-            chunks.append({
-                "chunk_text": chunk_text,
-                "pages": ",".join(str(x) for x in page_set),
-            })
-        start += step
+    for p in pages:
+        text = p["text"]
+        start = 0
+        while start < len(text):
+            end = min(start + chunk_size, len(text))
+            chunk_text = text[start:end].strip()
+            if chunk_text:
+                chunks.append({
+                    "chunk_text": chunk_text,
+                    "pages": str(p["page"]),
+                })
+            if end == len(text):
+                break
+            start += step
 
     return chunks
 
@@ -81,6 +78,7 @@ def build_records_from_pdf(
             "pages": c["pages"],
             "chunk_id": i,
             "chunk_text": c["chunk_text"],
+            "chunk_hash": sha256_text(c["chunk_text"]),  # unchanged chunks are reused on re-ingest
             "status": "ACTIVE",
         })
 
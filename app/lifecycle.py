@@ -0,0 +1,34 @@
+import os
+from typing import Iterable, Optional
+
+import numpy as np
+
+# Chunks removed by an incremental re-ingest stay in index.faiss (positions are never reused)
+# but are flagged here, position-aligned with the index: True = retired, never returned by search.
+RETIRED_FILE = "retired.npy"
+
+def load_retired(index_dir: str, ntotal: int) -> Optional[np.ndarray]:
+    """Retired flags padded to `ntotal` (positions added after the last retire are live)."""
+    path = os.path.join(index_dir, RETIRED_FILE)
+    if not os.path.exists(path):
+        return None
+    retired = np.load(path)
+    if len(retired) < ntotal:
+        retired = np.concatenate([retired, np.zeros(ntotal - len(retired), dtype=bool)])
+    return retired[:ntotal]
+
+def retire(index_dir: str, ntotal: int, positions: Iterable[int]) -> np.ndarray:
+    retired = load_retired(index_dir, ntotal)
+    if retired is None:
+        retired = np.zeros(ntotal, dtype=bool)
+    retired[np.fromiter(positions, dtype=np.int64)] = True
+    tmp = os.path.join(index_dir, RETIRED_FILE + ".tmp.npy")
+    np.save(tmp, retired)
+    os.replace(tmp, os.path.join(index_dir, RETIRED_FILE))
+    return retired
+
+def live_mask(retired: Optional[np.ndarray], mask: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """Combine an optional search mask (ACL) with the live positions; None = no restriction."""
+    if retired is None or not retired.any():
+        return mask
+    return ~retired if mask is None else mask & ~retired
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from .config import TENANT_MAX_CONCURRENCY, TENANT_MAX_QUEUE, QUEUE_TIMEOUT_MS
+
+class Overloaded(Exception):
+    """Concurrency slot not available (queue full or wait timed out); the API answers 429."""
+
+class ConcurrencyLimiter:
+    """
+    At most `max_concurrent` requests per key (tenant or namespace) run at once;
+    up to `max_queue` more wait (FIFO) for `queue_timeout_ms`, anything beyond is rejected.
+
+    Admission happens on the event loop (waiting requests hold no worker thread), so one
+    tenant can hold at most `max_concurrent` threadpool threads. Not thread-safe: use it
+    from async endpoints only.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = TENANT_MAX_CONCURRENCY,
+        max_queue: int = TENANT_MAX_QUEUE,
+        queue_timeout_ms: int = QUEUE_TIMEOUT_MS,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout_ms = queue_timeout_ms
+        self._active: Dict[Hashable, int] = {}
+        self._waiting: Dict[Hashable, int] = {}
+        self._waiters: Dict[Hashable, Deque["asyncio.Future[None]"]] = {}
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        keys = set(self._active) | set(self._waiting)
+        return {str(k): {"active": self._active.get(k, 0), "waiting": self._waiting.get(k, 0)} for k in keys}
+
+    @asynccontextmanager
+    async def queued(self, key: Hashable) -> AsyncIterator[None]:
+        """A place in `key`'s queue (no slot), e.g. for a request waiting on a coalesced one."""
+        if self.max_concurrent <= 0:
+            yield
+            return
+        if self._waiting.get(key, 0) >= self.max_queue:
+            raise Overloaded(f"Too many requests in flight for '{key}'")
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable) -> AsyncIterator[None]:
+        if self.max_concurrent <= 0:  # unlimited
+            yield
+            return
+
+        if self._active.get(key, 0) < self.max_concurrent:
+            self._active[key] = self._active.get(key, 0) + 1
+        else:
+            async with self.queued(key):
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.setdefault(key, deque()).append(waiter)
+                try:
+                    # a releasing request hands its slot over by resolving the waiter
+                    await asyncio.wait_for(waiter, timeout=self.queue_timeout_ms / 1000)
+                except asyncio.TimeoutError:
+                    raise Overloaded(f"Timed out waiting for a slot for '{key}'")
+                except asyncio.CancelledError:
+                    if waiter.done() and not waiter.cancelled():
+                        self._release(key)  # slot handed over as the client went away: pass it on
+                    raise
+                finally:
+                    waiters = self._waiters.get(key)
+                    if waiters is not None and waiter in waiters:
+                        waiters.remove(waiter)
+                    if not waiters and key in self._waiters:
+                        del self._waiters[key]
+
+        try:
+            yield
+        finally:
+            self._release(key)
+
+    def _release(self, key: Hashable) -> None:
+        waiters = self._waiters.get(key)
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # slot stays taken, now by the waiter
+                return
+        self._active[key] -= 1
+        if not self._active[key]:
+            del self._active[key]
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution: the first caller starts `fn`,
+    the others await (and receive) its result or exception. The shared run is a task of its
+    own, so it completes for the followers even if the first caller goes away.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Task[Any]"] = {}
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        follower: Optional[Callable[[], AsyncContextManager[Any]]] = None,
+    ) -> Tuple[Any, bool]:
+        """
+        Returns (result, shared): shared is True for callers that did not start `fn`.
+        Followers wait inside `follower()` (e.g. a limiter queue place, so they count against it).
+        """
+        call = self._calls.get(key)
+        if call is not None:
+            async with (follower() if follower else nullcontext()):
+                return await asyncio.shield(call), True
+
+        call = self._calls[key] = asyncio.ensure_future(fn())
+        call.add_done_callback(lambda done: self._calls.pop(key) if self._calls.get(key) is done else None)
+        return await asyncio.shield(call), False
+
+class DeadlineRunner:
+    """
+    Runs deadline-bounded stages (rerank) so the request thread can stop waiting; an abandoned
+    call finishes in the background and its result is dropped.
+
+    Each limiter key gets its own pool (2 x TENANT_MAX_CONCURRENCY threads, least recently used
+    pools beyond `max_keys` are shut down), so one tenant's slow or abandoned calls never delay
+    another's. The deadline counts from when the call starts running, not from submission.
+    """
+
+    def __init__(
+        self,
+        workers_per_key: int = 2 * max(1, TENANT_MAX_CONCURRENCY),
+        queue_timeout_ms: int = QUEUE_TIMEOUT_MS,
+        max_keys: int = 256,
+    ):
+        self.workers_per_key = workers_per_key
+        self.queue_timeout_ms = queue_timeout_ms
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._pools: "OrderedDict[Hashable, ThreadPoolExecutor]" = OrderedDict()
+
+    def _pool(self, key: Hashable) -> ThreadPoolExecutor:
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = ThreadPoolExecutor(self.workers_per_key, thread_name_prefix="deadline")
+            self._pools.move_to_end(key)
+            while len(self._pools) > max(1, self.max_keys):
+                self._pools.popitem(last=False)[1].shutdown(wait=False)
+            return pool
+
+    def call(self, key: Hashable, fn: Callable[..., Any], timeout_s: float, *args: Any, **kwargs: Any) -> Tuple[Any, bool]:
+        """Returns (result, True), or (None, False) if `fn` did not finish within `timeout_s` of starting."""
+        if timeout_s <= 0:
+            return None, False
+        started = threading.Event()
+
+        def run() -> Any:
+            started.set()
+            return fn(*args, **kwargs)
+
+        future = self._pool(key).submit(run)
+        # only this key's own abandoned calls can hold its threads
+        if not started.wait(self.queue_timeout_ms / 1000):
+            future.cancel()
+            return None, False
+        try:
+            return future.result(timeout=timeout_s), True
+        except FutureTimeout:
+            return None, False
@@ -0,0 +1,374 @@
+import os
+import json
+import glob
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+from .config import (
+    MANIFEST_DB, INDEX_QUANTIZATION, PQ_M, RESCORE, RESCORE_FACTOR, EMBED_DIM, COARSE_DIM, COARSE_FACTOR,
+)
+from .tenancy import Tenancy
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS namespaces (
+    namespace   TEXT PRIMARY KEY,
+    tenant_id   TEXT NOT NULL,
+    dept_id     TEXT NOT NULL,
+    collection  TEXT NOT NULL,
+    generation  INTEGER NOT NULL DEFAULT 0,
+    updated_at  INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_namespaces_tenant ON namespaces(tenant_id, dept_id);
+CREATE INDEX IF NOT EXISTS idx_namespaces_updated ON namespaces(updated_at);
+
+CREATE TABLE IF NOT EXISTS docs (
+    namespace        TEXT NOT NULL,
+    doc_id           TEXT NOT NULL,
+    source           TEXT,
+    active_version   TEXT,
+    active_doc_hash  TEXT,
+    updated_at       INTEGER,
+    PRIMARY KEY (namespace, doc_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_docs_hash ON docs(namespace, active_doc_hash);
+
+CREATE TABLE IF NOT EXISTS versions (
+    namespace      TEXT NOT NULL,
+    doc_id         TEXT NOT NULL,
+    version        TEXT NOT NULL,
+    doc_hash       TEXT,
+    source         TEXT,
+    chunks         INTEGER NOT NULL DEFAULT 0,
+    status         TEXT NOT NULL,
+    ingested_at    INTEGER,
+    deprecated_at  INTEGER,
+    PRIMARY KEY (namespace, doc_id, version)
+);
+CREATE INDEX IF NOT EXISTS idx_versions_status ON versions(status, namespace);
+
+CREATE TABLE IF NOT EXISTS principals (
+    namespace  TEXT NOT NULL,
+    user_id    TEXT NOT NULL,
+    bit        INTEGER NOT NULL,
+    PRIMARY KEY (namespace, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS namespace_settings (
+    namespace  TEXT PRIMARY KEY,
+    settings   TEXT NOT NULL
+);
+"""
+
+def _split_namespace(namespace: str) -> Dict[str, str]:
+    # tenant__dept__collection  or  tenant__dept__user-<id>__collection
+    parts = namespace.split("__")
+    if len(parts) < 3:
+        raise ValueError(f"Unrecognized namespace: {namespace}")
+    return {"tenant_id": parts[0], "dept_id": parts[1], "collection": parts[-1]}
+
+class ManifestStore:
+    """
+    Governance manifest backed by SQLite (WAL mode).
+
+    - One row per namespace / doc / version, indexed by tenant and status.
+    - Version activation is a single transaction (deprecate previous + activate new).
+    - `generation` is bumped whenever ACTIVE versions change (cheap cache invalidation key).
+    """
+
+    def __init__(self, db_path: str = MANIFEST_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _tx(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ---------- reads ----------
+
+    def get_doc(self, namespace: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT * FROM docs WHERE namespace = ? AND doc_id = ?", (namespace, doc_id)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def find_active_by_hash(self, namespace: str, doc_hash: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT * FROM docs WHERE namespace = ? AND active_doc_hash = ? LIMIT 1", (namespace, doc_hash)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def generation(self, namespace: str) -> int:
+        row = self._conn().execute(
+            "SELECT generation FROM namespaces WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row["generation"] if row else 0
+
+    def get_settings(self, namespace: str) -> Dict[str, Any]:
+        row = self._conn().execute(
+            "SELECT settings FROM namespace_settings WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return json.loads(row["settings"]) if row else {}
+
+    def principal_bits(self, namespace: str, user_ids: List[str], create: bool = True) -> Dict[str, int]:
+        """
+        ACL bit position of each user in `namespace` (TENANCY_MODE=acl).
+        Bit 0 is reserved for department-wide sharing; unknown users get the next free bit.
+        """
+        bits: Dict[str, int] = {}
+        conn = self._conn()
+        for user_id in user_ids:
+            row = conn.execute(
+                "SELECT bit FROM principals WHERE namespace = ? AND user_id = ?", (namespace, user_id)
+            ).fetchone()
+            if row:
+                bits[user_id] = row["bit"]
+        missing = [u for u in user_ids if u not in bits]
+        if not missing or not create:
+            return bits
+
+        with self._tx() as conn:
+            for user_id in missing:
+                row = conn.execute(
+                    "SELECT bit FROM principals WHERE namespace = ? AND user_id = ?", (namespace, user_id)
+                ).fetchone()
+                if row is None:
+                    nxt = conn.execute(
+                        "SELECT COALESCE(MAX(bit), 0) + 1 AS bit FROM principals WHERE namespace = ?", (namespace,)
+                    ).fetchone()["bit"]
+                    conn.execute(
+                        "INSERT INTO principals (namespace, user_id, bit) VALUES (?, ?, ?)",
+                        (namespace, user_id, nxt),
+                    )
+                    bits[user_id] = nxt
+                else:
+                    bits[user_id] = row["bit"]
+        return bits
+
+    def list_namespaces(
+        self,
+        tenant_id: Optional[str] = None,
+        dept_id: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        where, params = [], []
+        if tenant_id:
+            where.append("tenant_id = ?")
+            params.append(tenant_id)
+        if dept_id:
+            where.append("dept_id = ?")
+            params.append(dept_id)
+        sql = "SELECT * FROM namespaces"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY updated_at DESC LIMIT ? OFFSET ?"
+        rows = self._conn().execute(sql, (*params, limit, offset)).fetchall()
+        return [dict(r) for r in rows]
+
+    def list_versions(
+        self,
+        namespace: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+        status: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        where, params = [], []
+        if namespace:
+            where.append("v.namespace = ?")
+            params.append(namespace)
+        if tenant_id:
+            where.append("n.tenant_id = ?")
+            params.append(tenant_id)
+        if status:
+            where.append("v.status = ?")
+            params.append(status.upper())
+        sql = "SELECT v.* FROM versions v JOIN namespaces n ON n.namespace = v.namespace"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY v.namespace, v.doc_id, v.ingested_at DESC LIMIT ? OFFSET ?"
+        rows = self._conn().execute(sql, (*params, limit, offset)).fetchall()
+        return [dict(r) for r in rows]
+
+    # ---------- writes ----------
+
+    def _touch_namespace(self, conn: sqlite3.Connection, namespace: str, now: int) -> None:
+        parts = _split_namespace(namespace)
+        conn.execute(
+            """
+            INSERT INTO namespaces (namespace, tenant_id, dept_id, collection, generation, updated_at)
+            VALUES (?, ?, ?, ?, 1, ?)
+            ON CONFLICT(namespace) DO UPDATE SET
+                generation = generation + 1,
+                updated_at = excluded.updated_at
+            """,
+            (namespace, parts["tenant_id"], parts["dept_id"], parts["collection"], now),
+        )
+
+    def bump_generation(self, namespace: str) -> None:
+        # visibility changed without a version change (e.g. ACL grants)
+        with self._tx() as conn:
+            self._touch_namespace(conn, namespace, int(time.time()))
+
+    def activate_version(
+        self,
+        tenancy: Tenancy,
+        doc_id: str,
+        version: str,
+        doc_hash: str,
+        source: str,
+        chunks: int,
+    ) -> Dict[str, Any]:
+        """
+        Deprecate the current ACTIVE version (if any) and activate `version`, atomically.
+        Returns {"status": "ACTIVATED" | "SKIPPED_DUPLICATE", "version": <active version>}.
+        """
+        ns = tenancy.namespace
+        now = int(time.time())
+        with self._tx() as conn:
+            row = conn.execute(
+                "SELECT active_version, active_doc_hash FROM docs WHERE namespace = ? AND doc_id = ?",
+                (ns, doc_id),
+            ).fetchone()
+
+            if row and row["active_doc_hash"] == doc_hash:
+                return {"status": "SKIPPED_DUPLICATE", "version": row["active_version"]}
+
+            if row and row["active_version"]:
+                conn.execute(
+                    "UPDATE versions SET status = 'DEPRECATED', deprecated_at = ? "
+                    "WHERE namespace = ? AND doc_id = ? AND version = ?",
+                    (now, ns, doc_id, row["active_version"]),
+                )
+
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO versions
+                    (namespace, doc_id, version, doc_hash, source, chunks, status, ingested_at, deprecated_at)
+                VALUES (?, ?, ?, ?, ?, ?, 'ACTIVE', ?, NULL)
+                """,
+                (ns, doc_id, str(version), doc_hash, source, chunks, now),
+            )
+            conn.execute(
+                """
+                INSERT INTO docs (namespace, doc_id, source, active_version, active_doc_hash, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(namespace, doc_id) DO UPDATE SET
+                    source = excluded.source,
+                    active_version = excluded.active_version,
+                    active_doc_hash = excluded.active_doc_hash,
+                    updated_at = excluded.updated_at
+                """,
+                (ns, doc_id, source, str(version), doc_hash, now),
+            )
+            self._touch_namespace(conn, ns, now)
+
+        return {"status": "ACTIVATED", "version": str(version)}
+
+    def set_settings(self, namespace: str, settings: Dict[str, Any]) -> None:
+        with self._tx() as conn:
+            conn.execute(
+                """
+                INSERT INTO namespace_settings (namespace, settings) VALUES (?, ?)
+                ON CONFLICT(namespace) DO UPDATE SET settings = excluded.settings
+                """,
+                (namespace, json.dumps(settings)),
+            )
+
+    # ---------- migration ----------
+
+    def import_json_manifests(self, manifest_dir: str) -> Dict[str, int]:
+        """
+        Import legacy storage/manifests/<namespace>.json files. Safe to re-run: docs / versions
+        already in the store (possibly changed by later ingests) are never overwritten.
+        """
+        counts = {"namespaces": 0, "docs": 0, "versions": 0}
+        for path in sorted(glob.glob(os.path.join(manifest_dir, "*.json"))):
+            ns = os.path.splitext(os.path.basename(path))[0]
+            parts = _split_namespace(ns)
+            with open(path, "r", encoding="utf-8") as f:
+                m = json.load(f)
+
+            updated_at = m.get("updated_at") or int(time.time())
+            with self._tx() as conn:
+                conn.execute(
+                    """
+                    INSERT INTO namespaces (namespace, tenant_id, dept_id, collection, generation, updated_at)
+                    VALUES (?, ?, ?, ?, 1, ?)
+                    ON CONFLICT(namespace) DO UPDATE SET
+                        generation = generation + 1,
+                        updated_at = MAX(COALESCE(updated_at, 0), excluded.updated_at)
+                    """,
+                    (ns, parts["tenant_id"], parts["dept_id"], parts["collection"], updated_at),
+                )
+                for doc_id, entry in m.get("docs", {}).items():
+                    cur = conn.execute(
+                        """
+                        INSERT INTO docs
+                            (namespace, doc_id, source, active_version, active_doc_hash, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(namespace, doc_id) DO NOTHING
+                        """,
+                        (ns, doc_id, entry.get("source"), entry.get("active_version"),
+                         entry.get("active_doc_hash"), updated_at),
+                    )
+                    if not cur.rowcount:
+                        continue  # already known: the store is authoritative for this doc
+                    for version, v in entry.get("versions", {}).items():
+                        conn.execute(
+                            """
+                            INSERT INTO versions
+                                (namespace, doc_id, version, doc_hash, source, chunks, status, ingested_at, deprecated_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT(namespace, doc_id, version) DO NOTHING
+                            """,
+                            (ns, doc_id, str(version), v.get("doc_hash"), v.get("source"),
+                             v.get("chunks", 0), v.get("status", "ACTIVE"),
+                             v.get("ingested_at"), v.get("deprecated_at")),
+                        )
+                        counts["versions"] += 1
+                    counts["docs"] += 1
+            counts["namespaces"] += 1
+        return counts
+
+@lru_cache(maxsize=None)
+def get_store() -> ManifestStore:
+    return ManifestStore()
+
+def namespace_settings(tenancy: Tenancy) -> Dict[str, Any]:
+    # env defaults, overridden by whatever was stored for this namespace
+    settings = {
+        "quantization": INDEX_QUANTIZATION,
+        "pq_m": PQ_M,
+        "rescore": RESCORE,
+        "rescore_factor": RESCORE_FACTOR,
+        "embed_dim": EMBED_DIM,
+        "coarse_dim": COARSE_DIM,
+        "coarse_factor": COARSE_FACTOR,
+    }
+    settings.update(get_store().get_settings(tenancy.namespace))
+    return settings
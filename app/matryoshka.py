@@ -0,0 +1,134 @@
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from .acl import filtered_search
+
+# Flat index over the first `coarse_dim` dims of every vector, position-aligned with index.faiss
+COARSE_FILE = "coarse.faiss"
+
+def prefix(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Matryoshka truncation: first `dim` components, re-normalized to unit length.
+    For text-embedding-3-* this matches asking the API for `dimensions=dim`.
+    """
+    v = np.ascontiguousarray(np.asarray(vectors, dtype="float32")[:, :dim])
+    faiss.normalize_L2(v)
+    return v
+
+def load_coarse(index_dir: str) -> Optional[faiss.Index]:
+    path = os.path.join(index_dir, COARSE_FILE)
+    return faiss.read_index(path) if os.path.exists(path) else None
+
+def save_coarse(index_dir: str, vectors: np.ndarray, coarse_dim: int, append: bool = True) -> faiss.Index:
+    coarse = load_coarse(index_dir) if append else None
+    if coarse is None or coarse.d != coarse_dim:
+        coarse = faiss.IndexFlatL2(coarse_dim)
+    coarse.add(prefix(vectors, coarse_dim))
+    faiss.write_index(coarse, os.path.join(index_dir, COARSE_FILE))
+    return coarse
+
+def full_vectors(index: faiss.Index, positions: np.ndarray, originals: Optional[np.ndarray] = None) -> np.ndarray:
+    if originals is not None:
+        return np.asarray(originals[positions], dtype="float32")
+    return np.vstack([index.reconstruct(int(p)) for p in positions])
+
+def two_stage_search(
+    coarse: faiss.Index,
+    index: faiss.Index,
+    query: np.ndarray,
+    k: int,
+    factor: int,
+    originals: Optional[np.ndarray] = None,
+    mask: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stage 1: coarse search over the low-dim prefix picks k * factor candidates
+    (restricted to `mask` positions when given).
+    Stage 2: full-width vectors re-score the candidates (squared L2, like the main index).
+    """
+    return two_stage_search_batch(coarse, index, query[:1], k, factor, originals, mask)[0]
+
+def two_stage_search_batch(
+    coarse: faiss.Index,
+    index: faiss.Index,
+    queries: np.ndarray,
+    k: int,
+    factor: int,
+    originals: Optional[np.ndarray] = None,
+    mask: Optional[np.ndarray] = None,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """`two_stage_search` for a matrix of queries: one coarse FAISS call, per-row re-scoring."""
+    _, ids = filtered_search(coarse, prefix(queries, coarse.d), k * factor, mask)
+    out = []
+    for row in range(len(queries)):
+        cand = ids[row][ids[row] >= 0]
+        if len(cand) == 0:
+            out.append((np.array([], dtype="float32"), cand))
+            continue
+        dists = ((full_vectors(index, cand, originals) - queries[row]) ** 2).sum(axis=1)
+        order = np.argsort(dists)[:k]
+        out.append((dists[order], cand[order]))
+    return out
+
+def benchmark(
+    vectors: np.ndarray,
+    configs: List[Dict[str, Any]],
+    k: int = 10,
+    n_queries: int = 50,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Recall@k vs full-width exact search for reduced embedding dims and two-stage settings.
+    config: {"embed_dim": d} and/or {"coarse_dim": c, "coarse_factor": f}.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    rng = np.random.default_rng(seed)
+    n_queries = min(n_queries, max(1, len(vectors) // 10))
+    perm = rng.permutation(len(vectors))
+    queries, base = vectors[perm[:n_queries]], vectors[perm[n_queries:]]
+    k = min(k, len(base))
+
+    exact = faiss.IndexFlatL2(base.shape[1])
+    exact.add(base)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for cfg in configs:
+        dim = min(cfg.get("embed_dim") or base.shape[1], base.shape[1])
+        b, q = (base, queries) if dim == base.shape[1] else (prefix(base, dim), prefix(queries, dim))
+        index = faiss.IndexFlatL2(dim)
+        index.add(b)
+
+        coarse_dim = cfg.get("coarse_dim") or 0
+        coarse = None
+        if coarse_dim and coarse_dim < dim:
+            coarse = faiss.IndexFlatL2(coarse_dim)
+            coarse.add(prefix(b, coarse_dim))
+
+        hits = 0
+        t0 = time.perf_counter()
+        for qi in range(len(q)):
+            if coarse is not None:
+                _, ids = two_stage_search(coarse, index, q[qi:qi + 1], k, cfg.get("coarse_factor", 8), b)
+            else:
+                _, ids = index.search(q[qi:qi + 1], k)
+                ids = ids[0]
+            hits += len(set(ids.tolist()) & set(truth[qi].tolist()))
+        elapsed = time.perf_counter() - t0
+
+        # dims touched per query: full scan at `coarse_dim` (or `dim`) + candidate re-scoring
+        scanned = len(b) * (coarse_dim or dim) + (k * cfg.get("coarse_factor", 8) * dim if coarse is not None else 0)
+        rows.append({
+            "embed_dim": dim,
+            "coarse_dim": coarse_dim if coarse is not None else 0,
+            "coarse_factor": cfg.get("coarse_factor", 8) if coarse is not None else 0,
+            f"recall@{k}": round(hits / (k * len(q)), 4),
+            "flops_vs_full": round(scanned / (len(b) * base.shape[1]), 3),
+            "index_mb": round((index.ntotal * dim + (coarse.ntotal * coarse_dim if coarse else 0)) * 4 / 1e6, 3),
+            "latency_ms": round(elapsed / len(q) * 1000, 3),
+        })
+    return rows
@@ -0,0 +1,169 @@
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from .config import PQ_M, RESCORE_FACTOR, QUANT_MIN_TRAIN_INT8, QUANT_MIN_TRAIN_PQ
+from .acl import filtered_search
+
+QUANTIZATIONS = ("none", "fp16", "int8", "pq")
+
+# float32 copies of quantized vectors, kept next to index.faiss for exact re-scoring / re-training
+ORIGINALS_FILE = "vectors.npy"
+
+def load_originals(index_dir: str) -> Optional[np.ndarray]:
+    path = os.path.join(index_dir, ORIGINALS_FILE)
+    if not os.path.exists(path):
+        return None
+    # memory-mapped: only the re-scored rows are paged in
+    return np.load(path, mmap_mode="r")
+
+def save_originals(index_dir: str, vectors: np.ndarray, append: bool = True) -> None:
+    existing = load_originals(index_dir) if append else None
+    if existing is not None:
+        vectors = np.vstack([existing, vectors])
+    tmp = os.path.join(index_dir, ORIGINALS_FILE + ".tmp.npy")
+    np.save(tmp, np.asarray(vectors, dtype="float32"))
+    os.replace(tmp, os.path.join(index_dir, ORIGINALS_FILE))
+
+# 8-bit PQ codebooks: k-means needs at least one training point per centroid
+PQ_CENTROIDS = 256
+
+def min_train(quantization: str) -> int:
+    """Vectors needed before `quantization` gets trained; smaller namespaces stay Flat (exact)."""
+    if quantization == "int8":
+        return QUANT_MIN_TRAIN_INT8
+    if quantization == "pq":
+        return max(QUANT_MIN_TRAIN_PQ, PQ_CENTROIDS)
+    return 0
+
+def can_train(quantization: str, n_train: int) -> bool:
+    """Whether `quantization` can be trained on `n_train` vectors at all (ignoring min_train)."""
+    return quantization != "pq" or n_train >= PQ_CENTROIDS
+
+def factory_string(quantization: str, dim: int, n_train: int, pq_m: int = PQ_M, force: bool = False) -> str:
+    if not force and n_train < min_train(quantization):
+        return "Flat"  # not enough data to train codebooks / value ranges yet
+    if quantization == "fp16":
+        return "SQfp16"
+    if quantization == "int8":
+        return "SQ8"
+    if quantization == "pq":
+        m = max(1, min(pq_m, dim))
+        while dim % m:  # sub-quantizers must split the vector evenly
+            m -= 1
+        return f"PQ{m}x8"
+    return "Flat"
+
+def is_pending(index: faiss.Index, quantization: str) -> bool:
+    """Index still Flat while the namespace asks for a trained quantizer."""
+    return min_train(quantization) > 0 and isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+def build_index(vectors: np.ndarray, quantization: str, pq_m: int = PQ_M, force: bool = False) -> faiss.Index:
+    """
+    Empty (but trained) FAISS index for `quantization`; vectors are only used for training.
+    Below min_train(quantization) vectors this is a Flat index (see is_pending), unless
+    `force` (benchmarks: measure the quantizer itself; requires can_train).
+    """
+    if force and not can_train(quantization, len(vectors)):
+        raise ValueError(f"{quantization} needs at least {PQ_CENTROIDS} training vectors, got {len(vectors)}")
+    index = faiss.index_factory(vectors.shape[1], factory_string(quantization, vectors.shape[1], len(vectors), pq_m, force))
+    if not index.is_trained:
+        index.train(vectors)
+    return index
+
+def search(
+    index: faiss.Index,
+    query: np.ndarray,
+    k: int,
+    originals: Optional[np.ndarray] = None,
+    rescore_factor: int = 1,
+    mask: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k (squared L2 distances, positions) for one query row.
+    With `originals` (float32, usually memory-mapped) the top k * rescore_factor
+    quantized candidates are re-ranked by exact distance.
+    `mask` restricts the search to allowed positions (ACL).
+    """
+    return search_batch(index, query[:1], k, originals, rescore_factor, mask)[0]
+
+def search_batch(
+    index: faiss.Index,
+    queries: np.ndarray,
+    k: int,
+    originals: Optional[np.ndarray] = None,
+    rescore_factor: int = 1,
+    mask: Optional[np.ndarray] = None,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """`search` for a matrix of queries: one FAISS call, per-row re-scoring."""
+    if originals is None or rescore_factor <= 1:
+        scores, ids = filtered_search(index, queries, k, mask)
+        return list(zip(scores, ids))
+
+    _, ids = filtered_search(index, queries, k * rescore_factor, mask)
+    out = []
+    for row in range(len(queries)):
+        cand = ids[row][ids[row] >= 0]
+        dists = ((np.asarray(originals[cand], dtype="float32") - queries[row]) ** 2).sum(axis=1)
+        order = np.argsort(dists)[:k]
+        out.append((dists[order], cand[order]))
+    return out
+
+def benchmark(
+    vectors: np.ndarray,
+    configs: List[Dict[str, Any]],
+    k: int = 10,
+    n_queries: int = 50,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Recall@k / memory / latency of quantization settings on real namespace vectors.
+    Held-out vectors are used as queries; ground truth is exact float32 search.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    rng = np.random.default_rng(seed)
+    n_queries = min(n_queries, max(1, len(vectors) // 10))
+    perm = rng.permutation(len(vectors))
+    queries, base = vectors[perm[:n_queries]], vectors[perm[n_queries:]]
+    k = min(k, len(base))
+
+    exact = faiss.IndexFlatL2(base.shape[1])
+    exact.add(base)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for cfg in configs:
+        # measure the quantizer itself, even below the namespace's min_train
+        if not can_train(cfg["quantization"], len(base)):
+            rows.append({
+                "quantization": cfg["quantization"],
+                "rescore": bool(cfg.get("rescore")),
+                "skipped": f"not enough vectors to train ({len(base)} < {PQ_CENTROIDS})",
+            })
+            continue
+        index = build_index(base, cfg["quantization"], cfg.get("pq_m", PQ_M), force=True)
+        index.add(base)
+        originals = base if cfg.get("rescore") else None
+        factor = cfg.get("rescore_factor", RESCORE_FACTOR)
+
+        hits = 0
+        t0 = time.perf_counter()
+        for qi in range(len(queries)):
+            _, ids = search(index, queries[qi:qi + 1], k, originals, factor)
+            hits += len(set(ids.tolist()) & set(truth[qi].tolist()))
+        elapsed = time.perf_counter() - t0
+
+        index_bytes = len(faiss.serialize_index(index))
+        rows.append({
+            "quantization": cfg["quantization"],
+            "index": factory_string(cfg["quantization"], base.shape[1], len(base), cfg.get("pq_m", PQ_M), force=True),
+            "rescore": bool(cfg.get("rescore")),
+            f"recall@{k}": round(hits / (k * len(queries)), 4),
+            "index_mb": round(index_bytes / 1e6, 3),
+            "bytes_per_vector": round(index_bytes / len(base), 1),
+            "latency_ms": round(elapsed / len(queries) * 1000, 3),
+        })
+    return rows
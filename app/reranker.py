@@ -1,7 +1,17 @@
+from functools import lru_cache
 from typing import List, Dict
-from langchain_openai import ChatOpenAI
 from .config import OPENAI_API_KEY, LLM_MODEL, TOP_N
 
+@lru_cache(maxsize=None)
+def get_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=LLM_MODEL,
+        api_key=OPENAI_API_KEY,
+        temperature=0.0,
+        max_tokens=200,
+    )
+
 def rerank(question: str, retrieved: List[Dict], top_n: int = TOP_N) -> List[Dict]:
     if not retrieved:
         return []
@@ -9,12 +19,7 @@ def rerank(question: str, retrieved: List[Dict], top_n: int = TOP_N) -> List[Dic
     if not OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY missing in .env")
 
-    llm = ChatOpenAI(
-        model=LLM_MODEL,
-        api_key=OPENAI_API_KEY,
-        temperature=0.0,
-        max_tokens=200,
-    )
+    llm = get_llm()
 
     candidates = []
     for i, r in enumerate(retrieved, 1):
@@ -48,4 +53,4 @@ Candidates:
     if not picked_indices:
         picked_indices = list(range(min(top_n, len(retrieved))))
 
-    return [retrieved[i] for i in picked_indices]
\ No newline at end of file
+    return [retrieved[i] for i in picked_indices]
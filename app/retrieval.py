@@ -1,26 +1,159 @@
 import os
-from typing import List, Dict
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Any
 
-from .config import OPENAI_API_KEY, EMBED_MODEL, TOP_K
+import numpy as np
+
+from .config import OPENAI_API_KEY, TOP_K, INDEX_CACHE_MAX, TENANCY_MODE
 from .tenancy import Tenancy
+from .embedding import get_embeddings, embed_width
+from .manifest_store import get_store, namespace_settings
+from .quantization import load_originals, search_batch as quantized_search_batch
+from .matryoshka import load_coarse, prefix, two_stage_search_batch
+from .acl import ACL_FILE, PUBLIC_BIT, load_acl, check_aligned, allowed
+from .lifecycle import load_retired, live_mask
+
+# Process-wide index cache: index_dir -> {"mtime", "db", "originals", "coarse", "acl", "retired"},
+# least recently used namespaces evicted beyond INDEX_CACHE_MAX
+_index_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_index_lock = threading.Lock()
+
+def _remember(index_dir: str, entry: Dict[str, Any]) -> None:
+    with _index_lock:
+        _index_cache[index_dir] = entry
+        _index_cache.move_to_end(index_dir)
+        while len(_index_cache) > max(1, INDEX_CACHE_MAX):
+            _index_cache.popitem(last=False)
+
+def _load_acl(index_dir: str, ntotal: int) -> Optional[np.ndarray]:
+    # only acl mode filters by ACL; a misaligned acl.npy is an error there (fail closed)
+    acl = load_acl(index_dir) if TENANCY_MODE == "acl" else None
+    if acl is None:
+        return None
+    if len(acl) > ntotal:
+        acl = acl[:ntotal]  # ingest saves acl.npy before index.faiss: rows past the loaded index are not searchable yet
+    return check_aligned(acl, ntotal)
+
+def _load(index_dir: str) -> Optional[Dict[str, Any]]:
+    from langchain_community.vectorstores import FAISS
+
+    index_file = os.path.join(index_dir, "index.faiss")
+    if not os.path.exists(index_file):
+        return None
+
+    # ACL grants rewrite acl.npy only, so it is part of the cache key
+    acl_file = os.path.join(index_dir, ACL_FILE)
+    mtime = (os.stat(index_file).st_mtime_ns, os.stat(acl_file).st_mtime_ns if os.path.exists(acl_file) else 0)
+    with _index_lock:
+        cached = _index_cache.get(index_dir)
+        if cached:
+            _index_cache.move_to_end(index_dir)
+    if cached and cached["mtime"] == mtime:
+        return cached
+    if cached and cached["mtime"][0] == mtime[0]:
+        # only the ACL changed: keep the loaded index
+        entry = {**cached, "mtime": mtime, "acl": _load_acl(index_dir, cached["db"].index.ntotal)}
+        _remember(index_dir, entry)
+        return entry
+
+    db = FAISS.load_local(index_dir, get_embeddings(), allow_dangerous_deserialization=True)
+    # side files out of sync with the index are ignored (no re-scoring / single-stage search)
+    originals = load_originals(index_dir)
+    if originals is not None and len(originals) != db.index.ntotal:
+        originals = None
+    coarse = load_coarse(index_dir)
+    if coarse is not None and coarse.ntotal != db.index.ntotal:
+        coarse = None
+
+    acl = _load_acl(index_dir, db.index.ntotal)
+
+    # retired.npy is only rewritten together with index.faiss (re-ingest), so it shares its mtime
+    retired = load_retired(index_dir, db.index.ntotal)
+
+    entry = {"mtime": mtime, "db": db, "originals": originals, "coarse": coarse, "acl": acl, "retired": retired}
+    _remember(index_dir, entry)
+    return entry
+
+def load_index(index_dir: str):
+    """
+    Return the FAISS store for `index_dir`, loading it at most once per process.
+    A newer index.faiss on disk (ingest from any worker) triggers a reload.
+    """
+    entry = _load(index_dir)
+    return entry["db"] if entry else None
 
-def search(tenancy: Tenancy, query: str, top_k: int = TOP_K) -> List[Dict]:
+def _query_embeddings(tenancy: Tenancy):
+    # queries are embedded at the width of the namespace's index, not just the current EMBED_DIM
+    entry = _load(tenancy.index_dir_current)
+    return get_embeddings(embed_width(namespace_settings(tenancy), entry["db"].index.d if entry else None))
+
+def embed_query(tenancy: Tenancy, query: str) -> List[float]:
+    if not OPENAI_API_KEY:
+        raise RuntimeError("OPENAI_API_KEY missing in .env")
+
+    return _query_embeddings(tenancy).embed_query(query)
+
+def embed_queries(tenancy: Tenancy, queries: List[str]) -> List[List[float]]:
+    """All queries in one batched embeddings call."""
+    if not OPENAI_API_KEY:
+        raise RuntimeError("OPENAI_API_KEY missing in .env")
+
+    return _query_embeddings(tenancy).embed_documents(queries)
+
+def search(tenancy: Tenancy, query: str, top_k: int = TOP_K, query_vector: Optional[List[float]] = None) -> List[Dict]:
+    return search_batch(tenancy, [query], top_k, [query_vector] if query_vector is not None else None)[0]
+
+def search_batch(
+    tenancy: Tenancy,
+    queries: List[str],
+    top_k: int = TOP_K,
+    query_vectors: Optional[List[List[float]]] = None,
+) -> List[List[Dict]]:
+    """
+    Top-k chunks for each query: the namespace is loaded once and all queries
+    go through a single (matrix) FAISS search.
+    """
     if not OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY missing in .env")
 
-    index_dir = tenancy.index_dir_current
-    if not os.path.exists(index_dir):
-        return []
+    entry = _load(tenancy.index_dir_current)
+    if entry is None or not queries:
+        return [[] for _ in queries]
+    db, originals, coarse = entry["db"], entry["originals"], entry["coarse"]
+
+    # Reuse already computed query embeddings (e.g. from the semantic cache check)
+    if query_vectors is None:
+        query_vectors = embed_queries(tenancy, queries) if len(queries) > 1 else [embed_query(tenancy, queries[0])]
+    q = np.array(query_vectors, dtype="float32")
+    if q.shape[1] > db.index.d:
+        q = prefix(q, db.index.d)  # index not rebuilt for a smaller embed_dim yet
+    elif q.shape[1] < db.index.d:
+        raise ValueError(f"Query width {q.shape[1]} < index width {db.index.d}: embed queries with embed_query(tenancy, ...)")
+
+    # acl: only chunks shared with the department or this user (enforced inside the FAISS scan)
+    mask = None
+    if tenancy.scope == "acl" and entry["acl"] is not None:
+        user_bits = get_store().principal_bits(tenancy.namespace, [tenancy.user_id], create=False)
+        mask = allowed(entry["acl"], [PUBLIC_BIT, *user_bits.values()])
+    # chunks retired by an incremental re-ingest are excluded the same way
+    mask = live_mask(entry["retired"], mask)
 
-    emb = OpenAIEmbeddings(model=EMBED_MODEL, api_key=OPENAI_API_KEY)
-    db = FAISS.load_local(index_dir, emb, allow_dangerous_deserialization=True)
+    settings = namespace_settings(tenancy)
+    if coarse is not None and settings["coarse_dim"]:
+        hits = two_stage_search_batch(coarse, db.index, q, top_k, settings["coarse_factor"], originals, mask)
+    else:
+        factor = settings["rescore_factor"] if settings["rescore"] else 1
+        hits = quantized_search_batch(db.index, q, top_k, originals, factor, mask)
 
-    hits = db.similarity_search_with_score(query, k=top_k)
+    return [_results(db, scores, positions) for scores, positions in hits]
 
+def _results(db, scores: np.ndarray, positions: np.ndarray) -> List[Dict]:
     results = []
-    for doc, score in hits:
+    for score, pos in zip(scores, positions):
+        if pos < 0:
+            continue
+        doc = db.docstore.search(db.index_to_docstore_id[int(pos)])
         md = doc.metadata or {}
         results.append({
             "id": md.get("id", ""),
@@ -32,4 +165,4 @@ def search(tenancy: Tenancy, query: str, top_k: int = TOP_K) -> List[Dict]:
             "version": md.get("version", ""),
         })
 
-    return results
\ No newline at end of file
+    return results
@@ -3,7 +3,10 @@ from dataclasses import dataclass
 from typing import Literal
 from .config import STORAGE_ROOT, TENANCY_MODE
 
-Scope = Literal["dept", "user"]
+Scope = Literal["dept", "user", "acl"]
+
+def index_dir_for(namespace: str) -> str:
+    return os.path.join(STORAGE_ROOT, "indexes", namespace, "current")
 
 @dataclass(frozen=True)
 class Tenancy:
@@ -14,20 +17,23 @@ class Tenancy:
 
     @property
     def scope(self) -> Scope:
-        return "user" if TENANCY_MODE == "user" else "dept"
+        return TENANCY_MODE if TENANCY_MODE in ("user", "acl") else "dept"
 
     @property
     def namespace(self) -> str:
-        # cost-effective default: per-dept shared KB
-        if self.scope == "dept":
+        # cost-effective default: per-dept shared KB (acl: same index, filtered per user)
+        if self.scope in ("dept", "acl"):
             return f"{self.tenant_id}__{self.dept_id}__{self.collection}"
         # strict isolation: per-user KB
         return f"{self.tenant_id}__{self.dept_id}__user-{self.user_id}__{self.collection}"
 
     @property
     def index_dir_current(self) -> str:
-        return os.path.join(STORAGE_ROOT, "indexes", self.namespace, "current")
+        return index_dir_for(self.namespace)
 
     @property
-    def manifest_path(self) -> str:
-        return os.path.join(STORAGE_ROOT, "manifests", f"{self.namespace}.json")
\ No newline at end of file
+    def cache_dir(self) -> str:
+        # acl: answers depend on what the user may see, so cached answers are per user
+        if self.scope == "acl":
+            return os.path.join(STORAGE_ROOT, "cache", self.namespace, f"user-{self.user_id}")
+        return os.path.join(STORAGE_ROOT, "cache", self.namespace)
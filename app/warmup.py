@@ -0,0 +1,77 @@
+import os
+import json
+import time
+import threading
+from collections import Counter
+from typing import Dict, Any, List
+
+from .config import STORAGE_ROOT, WARMUP_NAMESPACES, WARMUP_STRATEGY, EMBED_DIM
+from .tenancy import index_dir_for
+from .manifest_store import get_store
+
+_traffic: Counter = Counter()
+_traffic_lock = threading.Lock()
+
+def _traffic_path() -> str:
+    return os.path.join(STORAGE_ROOT, "traffic.json")
+
+def record_traffic(namespace: str, count: int = 1) -> None:
+    with _traffic_lock:
+        _traffic[namespace] += count
+
+def flush_traffic() -> None:
+    # Merge this worker's counts into the shared file (called on shutdown)
+    with _traffic_lock:
+        if not _traffic:
+            return
+        path = _traffic_path()
+        counts: Dict[str, int] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                counts = json.load(f)
+        for ns, n in _traffic.items():
+            counts[ns] = counts.get(ns, 0) + n
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(counts, f, indent=2)
+        _traffic.clear()
+
+def hottest_namespaces(limit: int = WARMUP_NAMESPACES, strategy: str = WARMUP_STRATEGY) -> List[str]:
+    if strategy == "traffic" and os.path.exists(_traffic_path()):
+        with open(_traffic_path(), "r", encoding="utf-8") as f:
+            counts = json.load(f)
+        ranked = sorted(counts, key=lambda ns: counts[ns], reverse=True)
+    else:
+        # namespaces are indexed by updated_at in the manifest store
+        ranked = [n["namespace"] for n in get_store().list_namespaces(limit=limit * 4)]
+
+    return [ns for ns in ranked if os.path.exists(index_dir_for(ns))][:limit]
+
+def warm_up(limit: int = WARMUP_NAMESPACES) -> Dict[str, Any]:
+    """
+    Pay cold-start costs before serving traffic:
+    heavy imports, OpenAI clients, and FAISS indexes of the hottest namespaces.
+    """
+    from .embedding import get_embeddings
+    from .retrieval import load_index
+    from .reranker import get_llm as rerank_llm
+    from .generation import get_llm as generation_llm
+
+    timings: Dict[str, Any] = {}
+
+    t0 = time.perf_counter()
+    from langchain_community.vectorstores import FAISS  # noqa: F401
+    get_embeddings(EMBED_DIM)  # the client queries use for namespaces on the default width
+    rerank_llm()
+    generation_llm()
+    timings["clients_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+
+    loaded = {}
+    for ns in hottest_namespaces(limit):
+        t1 = time.perf_counter()
+        load_index(index_dir_for(ns))
+        loaded[ns] = round((time.perf_counter() - t1) * 1000, 2)
+
+    timings["indexes_ms"] = loaded
+    timings["total_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return timings
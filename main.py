@@ -2,18 +2,183 @@
 FortressRAG — entry point.
 
 Usage:
-  python main.py serve
+  python main.py serve [--prod] [workers=N]
+  python main.py bench-startup
+  python main.py import-manifests [manifest_dir]
+  python main.py quantize <tenant> <dept> <user> <none|fp16|int8|pq> [collection=...] [pq_m=N] [rescore=true|false]
+  python main.py bench-quant <tenant> <dept> <user> [collection=...] [k=10]
+  python main.py resize <tenant> <dept> <user> [embed_dim=N] [coarse_dim=N] [coarse_factor=N] [collection=...]
+  python main.py bench-dims <tenant> <dept> <user> [collection=...] [k=10]
+  python main.py eval [labels=eval/questions.jsonl] [synthetic=N] [configs=configs.json] [workers=4] [out=results.json] [--offline]
 
-  python main.py ingest <tenant> <dept> <user> <doc_id> <version> <file_path> [collection]
+  python main.py ingest <tenant> <dept> <user> <doc_id> <version> <file_path> [collection] [share=u1,u2|*]
   python main.py ask <tenant> <dept> <user> "<question>" [collection=...] [--no-rerank] [--debug]
+  python main.py ask-batch <tenant> <dept> <user> <questions_file> [collection=...] [out=results.jsonl] [concurrency=N] [--no-rerank] [--no-cache]
 """
 
 import sys
 import os
-import uvicorn
+import time
 
-def serve():
-    uvicorn.run("app.api:app", host="0.0.0.0", port=8000, reload=True)
+def serve(args):
+    import uvicorn
+    from app.config import SERVE_HOST, SERVE_PORT, SERVE_WORKERS
+
+    if "--prod" not in args:
+        # dev: single worker with auto-reload
+        uvicorn.run("app.api:app", host=SERVE_HOST, port=SERVE_PORT, reload=True)
+        return
+
+    workers = SERVE_WORKERS
+    for a in args:
+        if a.startswith("workers="):
+            workers = int(a.split("=", 1)[1])
+
+    # prod: no reloader, N worker processes; each warms up before /ready reports ready
+    uvicorn.run("app.api:app", host=SERVE_HOST, port=SERVE_PORT, workers=workers, log_level="info")
+
+def bench_startup_cmd():
+    t0 = time.perf_counter()
+    import app.api  # noqa: F401
+    t1 = time.perf_counter()
+
+    from app.warmup import warm_up
+    report = warm_up()
+    t2 = time.perf_counter()
+
+    print({
+        "import_api_ms": round((t1 - t0) * 1000, 2),
+        "warmup_ms": round((t2 - t1) * 1000, 2),
+        "warmup": report,
+        "ready_ms": round((t2 - t0) * 1000, 2),
+    })
+
+def import_manifests_cmd(args):
+    from app.config import STORAGE_ROOT
+    from app.manifest_store import get_store
+
+    manifest_dir = args[0] if args else os.path.join(STORAGE_ROOT, "manifests")
+    if not os.path.isdir(manifest_dir):
+        print("❌ Manifest dir not found:", manifest_dir)
+        return
+
+    print(get_store().import_json_manifests(manifest_dir))
+
+def _kv_args(args):
+    return dict(a.split("=", 1) for a in args if "=" in a)
+
+def quantize_cmd(args):
+    from app.tenancy import Tenancy
+    from app.embedding import rebuild_namespace
+
+    tenant, dept, user, quantization = args[:4]
+    opts = _kv_args(args[4:])
+    overrides = {"quantization": quantization.lower()}
+    if "pq_m" in opts:
+        overrides["pq_m"] = int(opts["pq_m"])
+    if "rescore" in opts:
+        overrides["rescore"] = opts["rescore"].lower() in ("1", "true", "yes")
+
+    tenancy = Tenancy(tenant, dept, user, opts.get("collection", "knowledgebase"))
+    print(rebuild_namespace(tenancy, **overrides))
+
+def _namespace_vectors(tenancy):
+    from langchain_community.vectorstores import FAISS
+    from app.embedding import get_embeddings
+    from app.quantization import load_originals
+
+    index_dir = tenancy.index_dir_current
+    if not os.path.exists(index_dir):
+        return None
+
+    vectors = load_originals(index_dir)
+    if vectors is None:
+        db = FAISS.load_local(index_dir, get_embeddings(), allow_dangerous_deserialization=True)
+        vectors = db.index.reconstruct_n(0, db.index.ntotal)
+    return vectors
+
+def bench_quant_cmd(args):
+    import numpy as np
+    from app.tenancy import Tenancy
+    from app.quantization import benchmark
+
+    tenant, dept, user = args[:3]
+    opts = _kv_args(args[3:])
+    tenancy = Tenancy(tenant, dept, user, opts.get("collection", "knowledgebase"))
+
+    vectors = _namespace_vectors(tenancy)
+    if vectors is None:
+        print("❌ No index for namespace:", tenancy.namespace)
+        return
+
+    configs = [
+        {"quantization": "none"},
+        {"quantization": "fp16"},
+        {"quantization": "int8"},
+        {"quantization": "int8", "rescore": True},
+        {"quantization": "pq"},
+        {"quantization": "pq", "rescore": True},
+    ]
+    print(f"Namespace: {tenancy.namespace} | vectors: {len(vectors)} x {np.shape(vectors)[1]}")
+    for row in benchmark(np.asarray(vectors), configs, k=int(opts.get("k", 10))):
+        print(row)
+
+def resize_cmd(args):
+    from app.tenancy import Tenancy
+    from app.embedding import rebuild_namespace
+
+    tenant, dept, user = args[:3]
+    opts = _kv_args(args[3:])
+    overrides = {k: int(opts[k]) for k in ("embed_dim", "coarse_dim", "coarse_factor") if k in opts}
+
+    tenancy = Tenancy(tenant, dept, user, opts.get("collection", "knowledgebase"))
+    print(rebuild_namespace(tenancy, **overrides))
+
+def bench_dims_cmd(args):
+    import numpy as np
+    from app.tenancy import Tenancy
+    from app.matryoshka import benchmark
+
+    tenant, dept, user = args[:3]
+    opts = _kv_args(args[3:])
+    tenancy = Tenancy(tenant, dept, user, opts.get("collection", "knowledgebase"))
+
+    vectors = _namespace_vectors(tenancy)
+    if vectors is None:
+        print("❌ No index for namespace:", tenancy.namespace)
+        return
+
+    full = np.shape(vectors)[1]
+    configs = [{"embed_dim": d} for d in (full, 1024, 512, 256) if d <= full]
+    configs += [{"coarse_dim": c, "coarse_factor": f} for c in (128, 256) for f in (4, 8) if c < full]
+    print(f"Namespace: {tenancy.namespace} | vectors: {len(vectors)} x {full}")
+    for row in benchmark(np.asarray(vectors), configs, k=int(opts.get("k", 10))):
+        print(row)
+
+def eval_cmd(args):
+    import json
+    from app.evaluation import EmbeddingCache, load_labelled, synthetic_corpus, default_configs, evaluate
+
+    opts = _kv_args(args)
+    questions, corpus = load_labelled(opts.get("labels", "eval/questions.jsonl"))
+    if int(opts.get("synthetic", 0)):
+        sq, sc = synthetic_corpus(n_docs=int(opts["synthetic"]))
+        questions, corpus = questions + sq, corpus + sc
+
+    configs = default_configs()
+    if "configs" in opts:
+        # JSON list of overrides on the baseline, e.g. [{"chunk_size": 600}, {"quantization": "pq"}]
+        with open(opts["configs"], "r", encoding="utf-8") as f:
+            configs = [{**configs[0], **c} for c in json.load(f)]
+
+    cache = EmbeddingCache(offline="--offline" in args)
+    print(f"Questions: {len(questions)} | docs: {len(corpus)} | configs: {len(configs)}")
+    rows = evaluate(questions, corpus, configs, workers=int(opts.get("workers", 4)), cache=cache)
+    for row in rows:
+        print(row)
+    if "out" in opts:
+        with open(opts["out"], "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
 
 def ingest_cmd(args):
     from app.tenancy import Tenancy
@@ -22,7 +187,8 @@ def ingest_cmd(args):
     from app.embedding import ingest_into_namespace
 
     tenant, dept, user, doc_id, version, file_path = args[:6]
-    collection = args[6] if len(args) > 6 and not args[6].startswith("--") else "knowledgebase"
+    collection = args[6] if len(args) > 6 and not args[6].startswith("--") and "=" not in args[6] else "knowledgebase"
+    share_with = [u for u in _kv_args(args[6:]).get("share", "").split(",") if u]
 
     abs_path = os.path.abspath(file_path)
     if not os.path.exists(abs_path):
@@ -32,7 +198,7 @@ def ingest_cmd(args):
     meta = build_records_from_pdf(abs_path, CHUNK_SIZE, CHUNK_OVERLAP, doc_id, version)
     tenancy = Tenancy(tenant, dept, user, collection)
 
-    out = ingest_into_namespace(tenancy, meta)
+    out = ingest_into_namespace(tenancy, meta, share_with=share_with)
     print(out)
 
 def ask_cmd(args):
@@ -80,6 +246,51 @@ def ask_cmd(args):
     print("\n💬 Answer:\n")
     print(generate_answer(question, chunks))
 
+def _read_questions(path):
+    # one question per line; .jsonl lines are {"question": ...} objects
+    import json
+
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            questions.append(json.loads(line)["question"] if path.endswith(".jsonl") else line)
+    return questions
+
+def ask_batch_cmd(args):
+    import json
+    from app.tenancy import Tenancy
+    from app.batch import answer_batch
+    from app.config import BATCH_CONCURRENCY
+
+    tenant, dept, user, path = args[:4]
+    opts = _kv_args(args[4:])
+    if not os.path.exists(path):
+        print("❌ File not found:", os.path.abspath(path))
+        return
+
+    questions = _read_questions(path)
+    tenancy = Tenancy(tenant, dept, user, opts.get("collection", "knowledgebase"))
+
+    t0 = time.perf_counter()
+    results = answer_batch(
+        tenancy, questions,
+        use_reranker="--no-rerank" not in args,
+        use_cache="--no-cache" not in args,
+        concurrency=int(opts.get("concurrency", BATCH_CONCURRENCY)),
+    )
+    out = open(opts["out"], "w", encoding="utf-8") if "out" in opts else sys.stdout
+    try:
+        for r in results:
+            out.write(json.dumps(r) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"✅ {len(questions)} questions in {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+
 def main():
     if len(sys.argv) < 2:
         print(__doc__)
@@ -88,10 +299,36 @@ def main():
     cmd = sys.argv[1].lower()
 
     if cmd == "serve":
-        serve()
+        serve(sys.argv[2:])
+    elif cmd == "bench-startup":
+        bench_startup_cmd()
+    elif cmd == "import-manifests":
+        import_manifests_cmd(sys.argv[2:])
+    elif cmd == "quantize":
+        if len(sys.argv) < 6:
+            print("Usage: python main.py quantize <tenant> <dept> <user> <none|fp16|int8|pq> [collection=...] [pq_m=N] [rescore=true|false]")
+            return
+        quantize_cmd(sys.argv[2:])
+    elif cmd == "bench-quant":
+        if len(sys.argv) < 5:
+            print("Usage: python main.py bench-quant <tenant> <dept> <user> [collection=...] [k=10]")
+            return
+        bench_quant_cmd(sys.argv[2:])
+    elif cmd == "resize":
+        if len(sys.argv) < 5:
+            print("Usage: python main.py resize <tenant> <dept> <user> [embed_dim=N] [coarse_dim=N] [coarse_factor=N] [collection=...]")
+            return
+        resize_cmd(sys.argv[2:])
+    elif cmd == "bench-dims":
+        if len(sys.argv) < 5:
+            print("Usage: python main.py bench-dims <tenant> <dept> <user> [collection=...] [k=10]")
+            return
+        bench_dims_cmd(sys.argv[2:])
+    elif cmd == "eval":
+        eval_cmd(sys.argv[2:])
     elif cmd == "ingest":
         if len(sys.argv) < 8:
-            print("Usage: python main.py ingest <tenant> <dept> <user> <doc_id> <version> <file_path> [collection]")
+            print("Usage: python main.py ingest <tenant> <dept> <user> <doc_id> <version> <file_path> [collection] [share=u1,u2|*]")
             return
         ingest_cmd(sys.argv[2:])
     elif cmd == "ask":
@@ -99,9 +336,14 @@ def main():
             print('Usage: python main.py ask <tenant> <dept> <user> "<question>" [collection=...] [--no-rerank] [--debug]')
             return
         ask_cmd(sys.argv[2:])
+    elif cmd == "ask-batch":
+        if len(sys.argv) < 6:
+            print("Usage: python main.py ask-batch <tenant> <dept> <user> <questions_file> [collection=...] [out=results.jsonl] [concurrency=N] [--no-rerank] [--no-cache]")
+            return
+        ask_batch_cmd(sys.argv[2:])
     else:
         print("Unknown command:", cmd)
         print(__doc__)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,72 @@
+import os
+import hashlib
+import tempfile
+
+# app.config reads the environment at import time
+os.environ["TENANCY_MODE"] = "acl"
+os.environ["STORAGE_ROOT"] = tempfile.mkdtemp(prefix="fortressrag-test-")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import app.embedding as embedding
+from app.tenancy import Tenancy
+from app.ingestion import sha256_text
+from app.manifest_store import get_store
+from app.retrieval import search
+
+class HashEmbeddings(Embeddings):
+    """Deterministic bag-of-words vectors (no API calls)."""
+
+    def _embed(self, text):
+        v = np.zeros(64, dtype="float32")
+        for word in text.lower().split():
+            v[int(hashlib.sha256(word.encode()).hexdigest(), 16) % 64] += 1.0
+        return (v / (np.linalg.norm(v) or 1.0)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+@pytest.fixture(autouse=True)
+def fake_embeddings(monkeypatch):
+    monkeypatch.setattr(embedding, "_embeddings_client", lambda dimensions=None: HashEmbeddings())
+
+def _doc(doc_id, version, texts):
+    doc_hash = sha256_text("\n".join(texts))
+    records = [
+        {
+            "id": f"{doc_id}::v{version}::chunk-{i}",
+            "doc_id": doc_id,
+            "version": version,
+            "doc_hash": doc_hash,
+            "source": f"{doc_id}.pdf",
+            "pages": "1",
+            "chunk_id": i,
+            "chunk_text": text,
+            "chunk_hash": sha256_text(text),
+        }
+        for i, text in enumerate(texts)
+    ]
+    return {"doc_hash": doc_hash, "file_name": f"{doc_id}.pdf", "records": records}
+
+def test_reingest_requires_access_to_active_version():
+    alice = Tenancy("t", "d", "alice")
+    bob = Tenancy("t", "d", "bob")
+
+    embedding.ingest_into_namespace(alice, _doc("report", "1", ["alice plan alpha", "alice budget beta"]))
+    with pytest.raises(PermissionError):
+        embedding.ingest_into_namespace(bob, _doc("report", "2", ["bob notes gamma"]))
+
+    assert get_store().get_doc(alice.namespace, "report")["active_version"] == "1"
+    texts = {r["chunk_text"] for r in search(alice, "alice plan alpha budget beta", top_k=4)}
+    assert texts == {"alice plan alpha", "alice budget beta"}
+    assert search(bob, "alice plan alpha budget beta", top_k=4) == []
+
+    # the owner can still publish a new version
+    out = embedding.ingest_into_namespace(alice, _doc("report", "2", ["alice plan alpha", "alice budget delta"]))
+    assert out["status"] == "INGESTED"